@@ -0,0 +1,226 @@
+import sys
+
+from PySide6.QtWidgets import QWidget
+from PySide6.QtGui import QGuiApplication, QImage, QPainter, QPixmap
+from PySide6.QtCore import Qt, QSize, QTimer, QElapsedTimer, Signal
+
+from framepack import FRAME_FORMAT, place_image, read_manifest
+from frames import frame_files, scale_image
+
+# Ways to signal a transition, cheapest first: a tray notification, a small
+# loop in a corner of the screen, the full-screen animation
+ALERT_TIERS = ("notification", "overlay", "animation")
+
+# Tray notification of each cue
+MESSAGES = {
+    "over": "Time for a break",
+    "counter": "Back to work",
+}
+# How long a tray notification stays up, in milliseconds
+NOTIFICATION_MS = 5000
+
+# The full animation gives way to the overlay when more than this share of
+# its frames was dropped...
+MAX_DROPPED_SHARE = 0.25
+# ...and the overlay to notifications when more than this share of its
+# frames was shown late
+MAX_LATE_SHARE = 0.5
+# Animations dropping too many frames this many times in a row fall back.
+# Those filling the frame cache do not count, the next ones play from it.
+FALLBACK_BAD_RUNS = 2
+# After this many alerts, a fallback gives the configured alert another try
+FALLBACK_ALERTS = 6
+
+
+def cheaper_tier(tier):
+    return ALERT_TIERS[max(0, ALERT_TIERS.index(tier) - 1)]
+
+
+def available_memory_mb():
+    # Memory the system can hand out without swapping, None where it cannot
+    # be read
+    if sys.platform == "win32":
+        return windows_available_memory_mb()
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def windows_available_memory_mb():
+    import ctypes
+
+    class MemoryStatusEx(ctypes.Structure):
+        _fields_ = [
+            ("dwLength", ctypes.c_ulong),
+            ("dwMemoryLoad", ctypes.c_ulong),
+            ("ullTotalPhys", ctypes.c_ulonglong),
+            ("ullAvailPhys", ctypes.c_ulonglong),
+            ("ullTotalPageFile", ctypes.c_ulonglong),
+            ("ullAvailPageFile", ctypes.c_ulonglong),
+            ("ullTotalVirtual", ctypes.c_ulonglong),
+            ("ullAvailVirtual", ctypes.c_ulonglong),
+            ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+        ]
+
+    status = MemoryStatusEx()
+    status.dwLength = ctypes.sizeof(status)
+    if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+        return None
+    return status.ullAvailPhys // (1024 * 1024)
+
+
+def sample_frames(image_folder, count, size):
+    # `count` frames spread over the animation, each scaled to fit `size`.
+    # A held frame of an optimized folder shows the image it holds.
+    files = frame_files(image_folder)
+    if not files:
+        return []
+    manifest = read_manifest(image_folder)
+    images = []
+    for index in sorted({step * len(files) // count for step in range(count)}):
+        while files[index] is None and not manifest.is_empty(index):
+            index -= 1
+        if files[index] is None:
+            # Empty frame of an optimized folder
+            image = QImage(manifest.canvas, FRAME_FORMAT)
+            image.fill(Qt.transparent)
+            images.append(scale_image(image, size))
+            continue
+        image = QImage(str(files[index]))
+        if image.isNull():
+            continue
+        if manifest is not None:
+            # Crops go back on their canvas so every frame has the same size
+            canvas = QImage(manifest.canvas, FRAME_FORMAT)
+            place_image(canvas, manifest.crop(index, image), manifest.frames[index][1])
+            image = canvas
+        images.append(scale_image(image, size))
+    return images
+
+
+class CornerOverlay(QWidget):
+    # Small window in a corner of the primary screen looping a handful of
+    # frames of the animation. It holds a few small pixmaps and repaints a
+    # few times a second, where the full animation composites translucent
+    # windows the size of every screen at the animation's frame rate.
+
+    # Emitted when the overlay hides, with how many of its frames were late
+    finished = Signal(dict)
+
+    # Frames taken from the animation
+    FRAMES = 8
+    # Height of the overlay and distance from the screen edges, in device
+    # independent pixels
+    HEIGHT = 180
+    MARGIN = 24
+    # The overlay stays up at least this long, looping its frames
+    MIN_DURATION_MS = 4000
+
+    def __init__(self, fps=30):
+        super().__init__()
+        # Frame rate of the animations, to know how long they last
+        self.fps = fps
+
+        self.setWindowFlags(
+            Qt.WindowStaysOnTopHint
+            | Qt.FramelessWindowHint
+            | Qt.Tool
+            | Qt.WindowDoesNotAcceptFocus
+            | Qt.WindowTransparentForInput
+        )
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+
+        # image folder -> (pixmaps, animation length in ms), kept between
+        # alerts since they are small
+        self.clips = {}
+        self.pixmaps = []
+        self.index = 0
+        self.interval = 0
+        self.shown = 0
+        self.late = 0
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.next_frame)
+        self.since_frame = QElapsedTimer()
+        self.hide_timer = QTimer(self)
+        self.hide_timer.setSingleShot(True)
+        self.hide_timer.timeout.connect(self.end)
+
+    def load(self, image_folder):
+        if image_folder not in self.clips:
+            dpr = QGuiApplication.primaryScreen().devicePixelRatio()
+            height = round(self.HEIGHT * dpr)
+            pixmaps = []
+            # Wide enough for the frames to be fitted by their height
+            for image in sample_frames(image_folder, self.FRAMES, QSize(4 * height, height)):
+                pixmap = QPixmap.fromImage(image)
+                pixmap.setDevicePixelRatio(dpr)
+                pixmaps.append(pixmap)
+            self.clips[image_folder] = (pixmaps, len(frame_files(image_folder)) * 1000 / self.fps)
+        return self.clips[image_folder]
+
+    def play(self, image_folder):
+        # False when the animation has no frames to show
+        self.stop()
+        self.pixmaps, clip_ms = self.load(image_folder)
+        if not self.pixmaps:
+            return False
+        # The frames are spread over the animation, shown at its pace
+        self.interval = max(1, round(clip_ms / len(self.pixmaps)))
+        self.index = 0
+        self.shown = 1
+        self.late = 0
+
+        size = self.pixmaps[0].deviceIndependentSize().toSize()
+        area = QGuiApplication.primaryScreen().availableGeometry()
+        self.setGeometry(
+            area.right() + 1 - self.MARGIN - size.width(),
+            area.bottom() + 1 - self.MARGIN - size.height(),
+            size.width(),
+            size.height(),
+        )
+        self.show()
+        self.update()
+        self.since_frame.start()
+        self.timer.start(self.interval)
+        self.hide_timer.start(max(self.MIN_DURATION_MS, round(clip_ms)))
+        return True
+
+    def next_frame(self):
+        # A frame a whole interval behind missed its deadline
+        if self.since_frame.restart() > 2 * self.interval:
+            self.late += 1
+        self.shown += 1
+        self.index = (self.index + 1) % len(self.pixmaps)
+        self.update()
+
+    def paintEvent(self, event):
+        if not self.pixmaps:
+            return
+        painter = QPainter(self)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.drawPixmap(0, 0, self.pixmaps[self.index])
+        painter.end()
+
+    def end(self):
+        self.finished.emit({"frames": self.shown, "late": self.late})
+        self.stop()
+
+    def stop(self):
+        self.timer.stop()
+        self.hide_timer.stop()
+        self.pixmaps = []
+        self.hide()
+
+    def dispose(self):
+        # Final teardown, like FullScreenAnimation.dispose
+        self.stop()
+        self.clips = {}
+        self.deleteLater()
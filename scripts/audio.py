@@ -0,0 +1,72 @@
+import os
+
+from PySide6.QtCore import QUrl
+
+
+class SoundPool:
+    # One object per sound cue, created once and reused for every transition.
+    # A cue an animation follows goes through a QMediaPlayer, which reports
+    # its position as it plays. WAV cues played on their own are decoded
+    # into memory by a QSoundEffect, which starts them without setting up a
+    # media pipeline, but tells nothing of where it is.
+
+    def __init__(self):
+        # sound file -> QSoundEffect
+        self.effects = {}
+        # sound file -> (player, audio output)
+        self.players = {}
+
+    def preload(self, *sound_files, follow=False):
+        for sound_file in sound_files:
+            if sound_file and os.path.exists(sound_file):
+                self.cue(sound_file, follow)
+
+    def cue(self, sound_file, follow=False):
+        if not follow and sound_file.lower().endswith(".wav"):
+            return self.effect(sound_file)
+        return self.player(sound_file)
+
+    def effect(self, sound_file):
+        if sound_file not in self.effects:
+            # QtMultimedia is slow to load, it waits until a sound is needed
+            from PySide6.QtMultimedia import QSoundEffect
+
+            effect = QSoundEffect()
+            # Decoding starts here, in the background
+            effect.setSource(QUrl.fromLocalFile(sound_file))
+            self.effects[sound_file] = effect
+        return self.effects[sound_file]
+
+    def player(self, sound_file):
+        if sound_file not in self.players:
+            from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
+
+            audio_output = QAudioOutput()
+            player = QMediaPlayer()
+            player.setAudioOutput(audio_output)
+            player.setSource(QUrl.fromLocalFile(sound_file))
+            self.players[sound_file] = (player, audio_output)
+        return self.players[sound_file][0]
+
+    def play(self, sound_file, follow=False):
+        # Play a cue from the start, returns its effect or player, or None.
+        # With `follow`, it is always a player.
+        if not sound_file or not os.path.exists(sound_file):
+            return None
+        cue = self.cue(sound_file, follow)
+        # Stopping rewinds, in case the cue is still playing
+        cue.stop()
+        # An effect still decoding starts playing once it is loaded
+        cue.play()
+        return cue
+
+    def release(self):
+        for effect in self.effects.values():
+            effect.stop()
+            effect.deleteLater()
+        for player, audio_output in self.players.values():
+            player.stop()
+            player.deleteLater()
+            audio_output.deleteLater()
+        self.effects.clear()
+        self.players.clear()
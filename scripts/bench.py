@@ -0,0 +1,377 @@
+import sys
+import os
+import json
+import time
+import shutil
+import platform
+import statistics
+import argparse
+import tempfile
+import subprocess
+
+# Screen layouts the benchmark can emulate, as lists of (width, height)
+SCREENS = {
+    "1080p": [(1920, 1080)],
+    "1440p": [(2560, 1440)],
+    "4k": [(3840, 2160)],
+    "dual": [(2560, 1440), (1920, 1080)],
+}
+CLIPS = ["counter", "over"]
+# Animation loading modes, then the app's own end-of-work transition, cold
+# and with the next animation prefetched
+MODES = ["preload", "stream", "cache-cold", "cache-warm", "prefetch", "cycle", "cycle-prefetch"]
+
+# Each case runs in its own process so peak memory and screen layout are
+# its own
+CASE_TIMEOUT = 300
+
+
+def peak_rss_mb():
+    # Peak resident memory of this process so far
+    try:
+        import resource
+    except ImportError:
+        return windows_peak_rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    if sys.platform != "darwin":
+        peak *= 1024
+    return round(peak / (1024 * 1024), 1)
+
+
+def windows_peak_rss_mb():
+    counters = windows_memory_counters()
+    if counters is None:
+        return None
+    return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+
+
+def windows_memory_counters():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def screen_config(screens, path):
+    # Screen layout for Qt's offscreen platform, side by side
+    x = 0
+    config = []
+    for i, (width, height) in enumerate(screens):
+        config.append({
+            "name": f"screen{i}",
+            "x": x,
+            "y": 0,
+            "width": width,
+            "height": height,
+            "logicalDpi": 96,
+            "logicalBaseDpi": 96,
+            "dpr": 1,
+        })
+        x += width
+    with open(path, "w") as f:
+        json.dump({"screens": config}, f)
+
+
+def parse_screens(names):
+    # Preset names, or custom layouts such as 1920x1080+1280x1024
+    layouts = {}
+    for name in names.split(","):
+        if name in SCREENS:
+            layouts[name] = SCREENS[name]
+            continue
+        try:
+            layouts[name] = [
+                tuple(int(value) for value in screen.lower().split("x"))
+                for screen in name.split("+")
+            ]
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"unknown screen layout {name}")
+    return layouts
+
+
+def run_case(case):
+    # Runs in the child process, the parent already chose the screen layout
+    from PySide6.QtCore import QObject, QEvent
+
+    from playback import summarize
+
+    class PaintRecorder(QObject):
+        # Times every paint of the animation view once a frame is shown
+        def __init__(self, animation):
+            super().__init__()
+            self.animation = animation
+            self.paints = []
+            animation.view.installEventFilter(self)
+
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and self.animation.shown_index >= 0:
+                self.paints.append(time.perf_counter())
+            return False
+
+    def playback_result(recorder, started, stats):
+        paints = recorder.paints
+        intervals = [(b - a) * 1000 for a, b in zip(paints, paints[1:])]
+        result = {
+            "time_to_visible_ms": round((paints[0] - started) * 1000, 1) if paints else None,
+            "paints": len(paints),
+            "fps": round((len(paints) - 1) / (paints[-1] - paints[0]), 1) if len(paints) > 1 else None,
+            "paint_interval_ms": summarize(intervals),
+            "jitter_ms": round(statistics.pstdev(intervals), 2) if intervals else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        result.update(stats)
+        return result
+
+    if case["mode"].startswith("cycle"):
+        return run_cycle_case(case, PaintRecorder, playback_result)
+
+    from PySide6.QtWidgets import QApplication
+    app = QApplication(sys.argv[:1])
+
+    from frames import FrameCache
+    from playback import FullScreenAnimation
+
+    mode = case["mode"]
+    cache = None
+    if mode.startswith("cache"):
+        cache = FrameCache(case["cache_dir"], 1 << 40)
+
+    animation = FullScreenAnimation(
+        fps=case["fps"],
+        streaming=mode != "preload",
+        cache=cache,
+        all_screens=True,
+    )
+    recorder = PaintRecorder(animation)
+    stats = {}
+
+    def on_finished(result):
+        stats.update(result)
+        app.quit()
+
+    animation.finished.connect(on_finished)
+    animation.start_failed.connect(lambda: on_finished({"error": "no first frame"}))
+
+    if mode == "cache-warm" and not prime_cache(animation, cache, case["folder"]):
+        return {"error": "the frame cache was not filled"}
+
+    if mode == "prefetch":
+        # Let the prefetch complete, as it would ahead of a cue
+        animation.prefetch(case["folder"])
+        for source in animation.prefetched.values():
+            source.thread.join()
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    if not animation.play(case["folder"], case["sound"]):
+        return {"error": "no frames"}
+    load_rss = peak_rss_mb()
+    app.exec()
+    # Cache entries left to finish in the background are given up, their
+    # threads must not outlive Qt
+    animation.dispose()
+
+    result = playback_result(recorder, started, stats)
+    result["rss_before_mb"] = rss_before
+    result["load_peak_rss_mb"] = load_rss
+    return result
+
+
+def prime_cache(animation, cache, folder):
+    # Fill the cache for every screen first, like after a first play, so a
+    # warm run is warm whichever modes ran before it. No pixmaps are made,
+    # peak memory stays that of the timed run.
+    sizes = {}
+    for screen in animation.target_screens():
+        sizes[animation.variant_key(screen)] = (animation.load_size(screen), screen.devicePixelRatio())
+    cache.fill(folder, sizes.values())
+    cache.wait_filled()
+    for size, dpr in sizes.values():
+        key = cache.entry_key(folder, size, dpr)
+        if cache.read_meta(key) is None or not os.path.exists(cache.data_path(key)):
+            return False
+    return True
+
+
+def run_cycle_case(case, PaintRecorder, playback_result):
+    # Measures the app itself: startup to the first counter frame, then the
+    # end of a work period to the first 'over' frame
+    from PySide6.QtCore import QStandardPaths, QTimer, QEventLoop
+
+    # Keep the user's configuration and frame cache out of it
+    QStandardPaths.setTestModeEnabled(True)
+
+    import notime
+
+    started = time.perf_counter()
+    main = notime.MainApp()
+    main.sound_enabled = case["sound"] is not None
+
+    startup = {}
+    stats = {}
+    # Each phase runs its own loop, quitting the app's would shut it down
+    loop = QEventLoop()
+
+    if main.settings["startup_animation"] != "skip":
+        # The launch animation starts from the event loop, watch it from the
+        # first turn on and wait for it to end
+        recorders = []
+
+        def watch_startup():
+            window = main.get_animation_window()
+            recorders.append(PaintRecorder(window))
+            window.finished.connect(loop.quit)
+
+        QTimer.singleShot(0, watch_startup)
+        loop.exec()
+        paints = recorders[0].paints
+        startup = {"startup_ms": round((paints[0] - started) * 1000, 1) if paints else None}
+        main.animation_window.finished.disconnect(loop.quit)
+
+    if case["mode"] == "cycle-prefetch":
+        main.prefetch_next_animation()
+        for source in main.animation_window.prefetched.values():
+            source.thread.join()
+
+    window = main.get_animation_window()
+    recorder = PaintRecorder(window)
+
+    def on_finished(result):
+        stats.update(result)
+        loop.quit()
+
+    window.finished.connect(on_finished)
+    started = time.perf_counter()
+    main.cycle.run_cycle()
+    loop.exec()
+
+    result = playback_result(recorder, started, stats)
+    result.update(startup)
+    main.shutdown()
+    return result
+
+
+def run_child(case, screens, timeout):
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = os.path.join(tmp, "screens.json")
+        screen_config(screens, config_path)
+        env = dict(os.environ, QT_QPA_PLATFORM=f"offscreen:configfile={config_path}")
+        try:
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--case", json.dumps(case)],
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return {"error": "timeout"}
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        return {"error": process.stderr.strip()[-500:] or f"exit code {process.returncode}"}
+    return json.loads(lines[-1])
+
+
+def main():
+    base_path = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description="Benchmark animation loading and playback offscreen.")
+    parser.add_argument(
+        "--screens",
+        type=parse_screens,
+        default=parse_screens(",".join(SCREENS)),
+        help=f"comma separated screen layouts: {', '.join(SCREENS)} or WxH[+WxH] (default: all)",
+    )
+    parser.add_argument("--clips", default=",".join(CLIPS), help="comma separated clips from img/ (default: %(default)s)")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated modes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each case")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--sound", action="store_true", help="play the clip sounds and follow the audio clock")
+    parser.add_argument("-o", "--output", help="write results to this file instead of stdout")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # Child process running a single case
+        sys.path.insert(0, base_path)
+        print(json.dumps(run_case(json.loads(args.case))))
+        return 0
+
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode}")
+
+    results = []
+    cache_dir = tempfile.mkdtemp(prefix="notime-bench-")
+    try:
+        for screen_name, screens in args.screens.items():
+            for mode in modes:
+                # The app picks its own clip on a cycle
+                clips = ["over"] if mode.startswith("cycle") else args.clips.split(",")
+                for clip in clips:
+                    folder = os.path.join(base_path, "img", clip)
+                    sound = os.path.join(base_path, "se", f"{clip}.wav")
+                    case = {
+                        "mode": mode,
+                        "folder": folder,
+                        "sound": sound if args.sound and os.path.exists(sound) else None,
+                        "fps": args.fps,
+                        "cache_dir": os.path.join(cache_dir, screen_name),
+                    }
+                    for run in range(args.repeat):
+                        if mode == "cache-cold":
+                            # Every cold run starts from an empty cache
+                            shutil.rmtree(case["cache_dir"], ignore_errors=True)
+                        result = {"screens": screen_name, "clip": clip, "mode": mode, "run": run}
+                        result.update(run_child(case, screens, CASE_TIMEOUT))
+                        results.append(result)
+                        print(
+                            f"{screen_name} {clip} {mode} #{run}: "
+                            f"visible {result.get('time_to_visible_ms')} ms, "
+                            f"{result.get('fps')} fps, peak {result.get('peak_rss_mb')} MB"
+                            + (f", error {result['error']}" if "error" in result else ""),
+                            file=sys.stderr,
+                        )
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    from PySide6 import __version__ as pyside_version
+
+    report = {
+        "python": platform.python_version(),
+        "pyside": pyside_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import json
+import getpass
+import hashlib
+
+from PySide6.QtCore import QObject, QCoreApplication, QStandardPaths
+from PySide6.QtNetwork import QLocalServer, QLocalSocket
+
+# Requests and replies are JSON objects, one per line. Only QtCore and
+# QtNetwork are used, so a client starts in milliseconds.
+
+# How long a client waits for the app, in milliseconds
+TIMEOUT_MS = 2000
+
+
+def server_name():
+    # One instance per user and configuration folder, so an app running on
+    # Qt's test paths (bench.py, soak.py) leaves the user's instance alone
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        user = "user"
+    QCoreApplication.setOrganizationName("SECRET_GUEST")
+    QCoreApplication.setApplicationName("NOTIME")
+    location = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+    return f"notime-{user}-{hashlib.sha1(location.encode('utf-8')).hexdigest()[:8]}"
+
+
+def send(request, timeout_ms=TIMEOUT_MS):
+    # Reply of the running app to `request`, None when no app is listening
+    socket = QLocalSocket()
+    socket.connectToServer(server_name())
+    if not socket.waitForConnected(timeout_ms):
+        return None
+    socket.write((json.dumps(request) + "\n").encode())
+    socket.waitForBytesWritten(timeout_ms)
+    data = b""
+    while not data.endswith(b"\n"):
+        if not socket.waitForReadyRead(timeout_ms):
+            break
+        data += bytes(socket.readAll())
+    socket.disconnectFromServer()
+    try:
+        return json.loads(data)
+    except ValueError:
+        return {"ok": False, "error": "no reply"}
+
+
+class ControlServer(QObject):
+    # Answers requests from notimectl.py and from later launches of the app.
+    # `handler(request)` returns the reply.
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+        self.server = QLocalServer(self)
+        # Only the user running the app may control it
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_connection)
+
+    def listen(self, replace=False):
+        # False when the name cannot be taken. With user access only, Qt
+        # replaces a socket of the same name even when an instance listens
+        # on it, callers check that none answers first. With `replace`, a
+        # socket left behind by an instance that crashed is removed first.
+        name = server_name()
+        if replace:
+            QLocalServer.removeServer(name)
+        return self.server.listen(name)
+
+    def error(self):
+        return self.server.errorString()
+
+    def on_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda socket=socket: self.on_ready_read(socket))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def on_ready_read(self, socket):
+        while socket.canReadLine():
+            try:
+                request = json.loads(bytes(socket.readLine()))
+                if not isinstance(request, dict):
+                    raise ValueError
+            except ValueError:
+                reply = {"ok": False, "error": "invalid request"}
+            else:
+                reply = self.handler(request)
+            socket.write((json.dumps(reply) + "\n").encode())
+            socket.flush()
+
+    def close(self):
+        self.server.close()
@@ -0,0 +1,329 @@
+import sys
+import json
+import time
+import argparse
+
+# The work and break cycle, free of Qt: the app drives it from a QTimer, a
+# simulation from a virtual clock that jumps from one deadline to the next
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+class VirtualClock:
+    # Time that only moves when told to, in seconds
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def __call__(self):
+        return self.time
+
+    def advance(self, seconds):
+        self.time += seconds
+
+    def set(self, when):
+        # Never goes back
+        self.time = max(self.time, when)
+
+
+class Deadlines:
+    # Callbacks at absolute deadlines on a clock, with no timer of its own.
+    # Whatever drives it calls run_due() once next_deadline() has passed, and
+    # arm() is called whenever the earliest deadline may have changed.
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        # name -> (deadline in seconds, callback taking the deadline)
+        self.deadlines = {}
+
+    def now(self):
+        return self.clock()
+
+    def schedule(self, name, deadline, callback):
+        # Replaces any deadline already planned under the same name
+        self.deadlines[name] = (deadline, callback)
+        self.arm()
+
+    def schedule_in(self, name, seconds, callback):
+        self.schedule(name, self.clock() + seconds, callback)
+
+    def cancel(self, name):
+        if self.deadlines.pop(name, None) is not None:
+            self.arm()
+
+    def deadline(self, name):
+        entry = self.deadlines.get(name)
+        return entry[0] if entry is not None else None
+
+    def next_deadline(self):
+        if not self.deadlines:
+            return None
+        return min(deadline for deadline, _ in self.deadlines.values())
+
+    def arm(self):
+        pass
+
+    def run_due(self):
+        # Callbacks may schedule or cancel deadlines, look again after each one
+        while self.deadlines:
+            name, (deadline, callback) = min(self.deadlines.items(), key=lambda item: item[1][0])
+            if deadline > self.clock():
+                break
+            del self.deadlines[name]
+            callback(deadline)
+        self.arm()
+
+    def run_until(self, end):
+        # Fast-forward a VirtualClock through every deadline up to `end`
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > end:
+                break
+            self.clock.set(deadline)
+            self.run_due()
+        self.clock.set(end)
+
+
+class CycleEngine:
+    # Work and break periods on the deadlines of `scheduler`. Even steps end a
+    # work period with the "over" cue, odd ones end a break with "counter",
+    # and breaks alternate between the break intervals. The day ends once
+    # `total_duration` seconds have elapsed, paused time left out.
+    #
+    # on_cue(step, cue, late) runs at every boundary, `late` being how many
+    # seconds after its deadline it ran, on_prefetch(cue) `prefetch_seconds`
+    # ahead of it and on_end() at the end of the day.
+
+    def __init__(self, scheduler, on_cue=None, on_prefetch=None, on_end=None):
+        self.scheduler = scheduler
+        self.on_cue = on_cue
+        self.on_prefetch = on_prefetch
+        self.on_end = on_end
+
+        self.work_interval = 45 * 60
+        self.break_intervals = [10 * 60, 20 * 60]
+        self.total_duration = 8 * 60 * 60
+        self.prefetch_seconds = 0
+
+        self.cycle_step = 0
+        self.next_cue = None
+        self.paused = False
+        # Elapsed time is counted on the scheduler's clock
+        self.elapsed_before = 0.0
+        self.run_started = scheduler.now()
+
+    def configure(self, work_interval, break_intervals, total_duration, prefetch_seconds=0):
+        # Applies from the next start, resume or restart
+        self.work_interval = work_interval
+        self.break_intervals = break_intervals
+        self.total_duration = total_duration
+        self.prefetch_seconds = prefetch_seconds
+
+    def start(self):
+        # Plan the first cycle boundary and the end of the day from now
+        self.cycle_step = 0
+        now = self.scheduler.now()
+        self.schedule_cycle(now + self.work_interval, "over")
+        remaining = max(0, self.total_duration - self.elapsed_before)
+        self.scheduler.schedule("exit", now + remaining, self.end_of_day)
+
+    def stop(self):
+        for name in ("cycle", "prefetch", "exit"):
+            self.scheduler.cancel(name)
+
+    def pause(self):
+        self.stop()
+        # Save elapsed time up to now
+        self.elapsed_before = self.elapsed()
+        self.paused = True
+
+    def resume(self):
+        # A resumed day starts over with a work period
+        self.run_started = self.scheduler.now()
+        self.paused = False
+        self.start()
+
+    def restart(self):
+        self.stop()
+        self.elapsed_before = 0.0
+        self.run_started = self.scheduler.now()
+        self.paused = False
+        self.start()
+
+    def elapsed(self):
+        if self.paused:
+            return self.elapsed_before
+        return self.elapsed_before + self.scheduler.now() - self.run_started
+
+    def schedule_cycle(self, deadline, cue):
+        # Next cycle boundary, showing `cue`, with its prefetch ahead of it
+        self.scheduler.schedule("cycle", deadline, self.run_cycle)
+        self.next_cue = cue
+        if self.prefetch_seconds <= 0:
+            self.scheduler.cancel("prefetch")
+            return
+        self.scheduler.schedule("prefetch", deadline - self.prefetch_seconds, self.prefetch)
+
+    def prefetch(self, deadline=None):
+        if not self.paused and self.on_prefetch is not None:
+            self.on_prefetch(self.next_cue)
+
+    def end_of_day(self, deadline):
+        self.stop()
+        if self.on_end is not None:
+            self.on_end()
+
+    def run_cycle(self, deadline=None):
+        if self.paused:
+            return
+
+        now = self.scheduler.now()
+        if deadline is None:
+            deadline = now
+        step = self.cycle_step
+        if step % 2 == 0:
+            # End of work period, a break follows
+            cue = "over"
+            interval = self.break_intervals[(step // 2) % len(self.break_intervals)]
+            next_cue = "counter"
+        else:
+            # End of break
+            cue = "counter"
+            interval = self.work_interval
+            next_cue = "over"
+
+        # Boundaries follow each other from their planned time, not from when
+        # this one happened to run, unless the machine slept through the next
+        next_deadline = deadline + interval
+        if next_deadline <= now:
+            next_deadline = now + interval
+        self.schedule_cycle(next_deadline, next_cue)
+        self.cycle_step += 1
+
+        if self.on_cue is not None:
+            self.on_cue(step, cue, now - deadline)
+
+
+class Simulation:
+    # Days of cycles on a virtual clock, one app launch per day, with the
+    # time spent working and on break checked against the settings
+
+    def __init__(self, work_interval, break_intervals, total_duration, prefetch_seconds=0, pause=0):
+        self.clock = VirtualClock()
+        self.scheduler = Deadlines(self.clock)
+        self.engine = CycleEngine(self.scheduler, self.on_cue, self.on_prefetch, self.on_end)
+        self.engine.configure(work_interval, break_intervals, total_duration, prefetch_seconds)
+        # Seconds paused halfway through each day
+        self.pause = pause
+
+        self.cues = 0
+        self.prefetches = 0
+        self.max_late = 0.0
+        self.work_seconds = 0.0
+        self.break_seconds = 0.0
+        self.errors = []
+
+        self.state = None
+        self.since = 0.0
+        self.running = False
+        self.day_elapsed = 0.0
+
+    def switch(self, state):
+        # Close the current period and start the next
+        now = self.clock()
+        if self.state == "work":
+            self.work_seconds += now - self.since
+        elif self.state == "break":
+            self.break_seconds += now - self.since
+        self.state = state
+        self.since = now
+
+    def on_cue(self, step, cue, late):
+        self.cues += 1
+        self.max_late = max(self.max_late, late)
+        self.switch("break" if cue == "over" else "work")
+
+    def on_prefetch(self, cue):
+        self.prefetches += 1
+        due = self.scheduler.deadline("cycle")
+        if cue != self.engine.next_cue or abs(due - self.clock() - self.engine.prefetch_seconds) > 1e-6:
+            self.errors.append(f"prefetch of {cue} at {self.clock()} for a cue at {due}")
+
+    def on_end(self):
+        self.switch(None)
+        self.running = False
+        self.day_elapsed = self.engine.elapsed()
+
+    def run_day(self, day):
+        self.clock.set(day * DAY_SECONDS)
+        started = self.clock()
+        self.running = True
+        self.engine.restart()
+        self.switch("work")
+        if self.pause > 0:
+            self.scheduler.run_until(started + self.engine.total_duration / 2)
+            self.engine.pause()
+            self.switch("paused")
+            self.clock.advance(self.pause)
+            self.engine.resume()
+            self.switch("work")
+        self.scheduler.run_until((day + 1) * DAY_SECONDS)
+
+        if self.running:
+            self.errors.append(f"day {day} did not end")
+        elif abs(self.day_elapsed - self.engine.total_duration) > 1e-6:
+            self.errors.append(f"day {day} lasted {self.day_elapsed} seconds")
+
+    def run(self, days):
+        started = time.perf_counter()
+        for day in range(days):
+            self.run_day(day)
+        seconds = time.perf_counter() - started
+
+        active = self.work_seconds + self.break_seconds
+        if abs(active - days * self.engine.total_duration) > 1e-3 * days:
+            self.errors.append(f"{active} active seconds over {days} days")
+        if self.max_late > 0:
+            self.errors.append(f"a cue ran {self.max_late} seconds late on a virtual clock")
+        return {
+            "days": days,
+            "cues": self.cues,
+            "prefetches": self.prefetches,
+            "work_seconds_per_day": round(self.work_seconds / days, 3),
+            "break_seconds_per_day": round(self.break_seconds / days, 3),
+            "seconds": round(seconds, 3),
+            "days_per_second": round(days / seconds, 1) if seconds > 0 else None,
+            "cues_per_second": round(self.cues / seconds, 1) if seconds > 0 else None,
+            "errors": self.errors[:20],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate work and break cycles on a virtual clock.")
+    parser.add_argument("--days", type=int, default=1000, help="days to simulate (default: %(default)s)")
+    parser.add_argument("--work", type=float, default=45, help="work interval in minutes (default: %(default)s)")
+    parser.add_argument(
+        "--breaks",
+        default="10,20",
+        help="comma separated break intervals in minutes, alternated (default: %(default)s)",
+    )
+    parser.add_argument("--total", type=float, default=8, help="total duration in hours (default: %(default)s)")
+    parser.add_argument("--prefetch", type=float, default=60, help="prefetch lead in seconds (default: %(default)s)")
+    parser.add_argument("--pause", type=float, default=0, help="minutes paused halfway through each day")
+    args = parser.parse_args()
+
+    simulation = Simulation(
+        work_interval=args.work * 60,
+        break_intervals=[float(minutes) * 60 for minutes in args.breaks.split(",")],
+        total_duration=args.total * 60 * 60,
+        prefetch_seconds=args.prefetch,
+        pause=args.pause * 60,
+    )
+    result = simulation.run(args.days)
+    print(json.dumps(result, indent=2))
+    # A failing exit code lets CI catch schedule regressions
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
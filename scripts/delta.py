@@ -0,0 +1,125 @@
+from PySide6.QtGui import QPainter, QPixmap
+from PySide6.QtCore import Qt, QRect
+
+# Frames are compared on a grid of square tiles, changed tiles are merged
+# into rectangles
+TILE_SIZE = 64
+# Past this share of changed pixels a full frame is cheaper than patches
+KEY_FRAME_RATIO = 0.5
+
+
+class Frame:
+    # One step of an animation. Key frames replace the whole canvas, other
+    # frames only carry patches for the rectangles that changed since the
+    # previous frame. A frame without patches holds the previous image.
+
+    def __init__(self, patches, key=False):
+        # List of (x, y, image) with image a QImage or a QPixmap
+        self.patches = patches
+        self.key = key
+
+    def rects(self):
+        return [QRect(x, y, image.width(), image.height()) for x, y, image in self.patches]
+
+    def to_pixmaps(self):
+        # Pixmaps can only be created on the GUI thread
+        patches = [(x, y, QPixmap.fromImage(image)) for x, y, image in self.patches]
+        return Frame(patches, self.key)
+
+
+def key_frame(image, bounds=None):
+    # With `bounds`, only the part of the image inside them is kept, the rest
+    # of the canvas is cleared
+    if bounds is None:
+        return Frame([(0, 0, image)], key=True)
+    return Frame([(bounds.x(), bounds.y(), image.copy(bounds))], key=True)
+
+
+def changed_rects(previous_data, data, width, height, bytes_per_line, tile=TILE_SIZE):
+    # Compare two frames of the same size band by band, then tile by tile in
+    # the bands that differ. Bytes slices are compared with memcmp, which is
+    # much faster than walking pixels from Python.
+    rects = []
+    # Column runs still open from the previous band, by (left, right)
+    open_runs = {}
+
+    for top in range(0, height, tile):
+        bottom = min(top + tile, height)
+        band_start = top * bytes_per_line
+        band_end = bottom * bytes_per_line
+        runs = []
+
+        if previous_data[band_start:band_end] != data[band_start:band_end]:
+            run_left = None
+            for left in range(0, width, tile):
+                right = min(left + tile, width)
+                tile_changed = False
+                for row in range(band_start, band_end, bytes_per_line):
+                    if previous_data[row + left * 4:row + right * 4] != data[row + left * 4:row + right * 4]:
+                        tile_changed = True
+                        break
+                if tile_changed and run_left is None:
+                    run_left = left
+                elif not tile_changed and run_left is not None:
+                    runs.append((run_left, left))
+                    run_left = None
+            if run_left is not None:
+                runs.append((run_left, width))
+
+        # Extend runs that continue the same columns downwards
+        next_runs = {}
+        for run in runs:
+            rect = open_runs.pop(run, None)
+            if rect is None:
+                rect = QRect(run[0], top, run[1] - run[0], 0)
+                rects.append(rect)
+            rect.setBottom(bottom - 1)
+            next_runs[run] = rect
+        open_runs = next_runs
+
+    return rects
+
+
+class DeltaEncoder:
+    # Turns a sequence of full images into key frames and delta frames
+
+    def __init__(self):
+        self.previous = None
+        self.previous_data = None
+
+    def encode(self, image, bounds=None):
+        # `bounds` holds every visible pixel of the image, when known
+        if image is None:
+            # Undecodable frame, keep showing the previous one
+            return Frame([])
+
+        data = image.constBits().tobytes()
+        previous, previous_data = self.previous, self.previous_data
+        self.previous, self.previous_data = image, data
+
+        if previous is None or previous.size() != image.size():
+            return key_frame(image, bounds)
+
+        rects = changed_rects(
+            previous_data,
+            data,
+            image.width(),
+            image.height(),
+            image.bytesPerLine(),
+        )
+        changed_area = sum(rect.width() * rect.height() for rect in rects)
+        if changed_area > KEY_FRAME_RATIO * image.width() * image.height():
+            return key_frame(image, bounds)
+        return Frame([(rect.x(), rect.y(), image.copy(rect)) for rect in rects])
+
+
+def draw_frame(painter, frame):
+    # Replace the pixels under each patch, alpha included
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    if frame.key:
+        painter.fillRect(painter.device().rect(), Qt.transparent)
+    for x, y, image in frame.patches:
+        if isinstance(image, QPixmap):
+            painter.drawPixmap(x, y, image)
+        else:
+            painter.drawImage(x, y, image)
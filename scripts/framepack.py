@@ -0,0 +1,380 @@
+import re
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+from pathlib import Path
+
+from PySide6.QtGui import QImage, QPainter
+from PySide6.QtCore import Qt, QRect, QSize
+
+from delta import DeltaEncoder, Frame, key_frame
+
+# Packed animation layout:
+#   header | frame blobs (64-byte aligned) | frame index
+# Frames are premultiplied ARGB32. Key frames are stored raw so they can be
+# wrapped in a QImage straight over the mapped file, or run-length encoded
+# for smaller files at the cost of one expansion per frame. Other frames
+# only store the rectangles that changed since the previous frame, key
+# frames that do not start at the top left corner are stored the same way.
+PACK_MAGIC = b"NTPK"
+PACK_VERSION = 1
+PACK_SUFFIX = ".ntpack"
+PACK_ALIGN = 64
+
+# magic, version, flags, frame count, canvas width, canvas height, index offset
+HEADER = struct.Struct("<4sHHIIIQ")
+# blob offset, blob length, width, height, bytes per line, encoding
+INDEX_ENTRY = struct.Struct("<QQIIIB3x")
+# RLE span: literal pixels followed by their bytes, then transparent pixels
+RLE_SPAN = struct.Struct("<II")
+# Delta frame: patch count, then x, y, width, height of each patch followed
+# by the pixels of all patches, one after the other
+DELTA_COUNT = struct.Struct("<I")
+DELTA_PATCH = struct.Struct("<IIII")
+
+ENCODING_RAW = 0
+ENCODING_RLE = 1
+ENCODING_DELTA = 2
+ENCODING_KEY_DELTA = 3
+
+FRAME_FORMAT = QImage.Format_ARGB32_Premultiplied
+
+# Runs of at least 8 fully transparent pixels are worth a span
+TRANSPARENT_RUN = re.compile(rb"\x00{32,}")
+
+
+# An optimized animation also lives next to its frame folder, img/over.opt.
+# Each frame is cropped to its visible pixels and runs of identical frames
+# are stored once. The manifest gives the canvas size, then for each stored
+# frame its file, where it goes on the canvas and how many frames it holds.
+# An uncropped file is the whole original frame, kept when a crop would be
+# larger, and the crop is cut from it once decoded. A fully transparent
+# frame has no file and clears the canvas.
+OPTIMIZED_SUFFIX = ".opt"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class PackError(Exception):
+    pass
+
+
+def list_frames(image_folder):
+    # Frames are stored as numbered WebP (or PNG) files, so name order is
+    # play order
+    for pattern in ("*.webp", "*.png"):
+        image_files = sorted(Path(image_folder).glob(pattern))
+        if image_files:
+            return image_files
+    return []
+
+
+def pack_path(image_folder):
+    # A packed animation lives next to its frame folder: img/over.ntpack
+    return os.path.normpath(image_folder) + PACK_SUFFIX
+
+
+def optimized_path(image_folder):
+    return os.path.normpath(image_folder) + OPTIMIZED_SUFFIX
+
+
+class Manifest:
+    def __init__(self, folder):
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data["version"] != MANIFEST_VERSION:
+                raise PackError(f"{self.path} has an unsupported version")
+            self.canvas = QSize(data["width"], data["height"])
+            # One entry per frame played: (file, rectangle on the canvas) for
+            # a new image, (None, empty rectangle) for an empty frame, None
+            # while the previous one holds
+            self.frames = []
+            # Frames whose file is not cropped
+            self.uncropped = set()
+            for entry in data["frames"]:
+                if entry["file"] is None:
+                    self.frames.append((None, QRect()))
+                    self.frames += [None] * (entry["hold"] - 1)
+                    continue
+                rect = QRect(entry["x"], entry["y"], entry["width"], entry["height"])
+                if entry.get("uncropped"):
+                    self.uncropped.add(len(self.frames))
+                self.frames.append((Path(folder) / entry["file"], rect))
+                self.frames += [None] * (entry["hold"] - 1)
+        except (OSError, ValueError, KeyError, TypeError):
+            raise PackError(f"{self.path} is not a valid manifest")
+
+    def frame_files(self):
+        # File of each frame, None for held and empty frames
+        return [entry[0] if entry is not None else None for entry in self.frames]
+
+    def image_files(self):
+        return [entry[0] for entry in self.frames if entry is not None and entry[0] is not None]
+
+    def is_empty(self, index):
+        entry = self.frames[index]
+        return entry is not None and entry[0] is None
+
+    def crop(self, index, image):
+        # The part of a decoded frame file placed on the canvas
+        if index in self.uncropped:
+            return image.copy(self.frames[index][1])
+        return image
+
+
+def read_manifest(image_folder):
+    # Manifest of the optimized version of a frame folder, None when there is
+    # none. A broken one falls back to the original frames.
+    folder = optimized_path(image_folder)
+    if not os.path.exists(os.path.join(folder, MANIFEST_NAME)):
+        return None
+    try:
+        return Manifest(folder)
+    except PackError:
+        return None
+
+
+def place_image(canvas, image, rect, previous=None):
+    # Replace the canvas with `image` drawn at `rect`, transparent elsewhere.
+    # When only the `previous` rectangle was drawn before, only it is cleared.
+    painter = QPainter(canvas)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    painter.fillRect(canvas.rect() if previous is None else previous, Qt.transparent)
+    painter.drawImage(rect.topLeft(), image)
+    painter.end()
+
+
+def rle_encode(data):
+    spans = []
+    literal_start = 0
+    for match in TRANSPARENT_RUN.finditer(data):
+        # Only whole pixels can be skipped
+        start = (match.start() + 3) & ~3
+        end = match.end() & ~3
+        if end - start < 32:
+            continue
+        spans.append(RLE_SPAN.pack((start - literal_start) // 4, (end - start) // 4))
+        spans.append(data[literal_start:start])
+        literal_start = end
+    spans.append(RLE_SPAN.pack((len(data) - literal_start) // 4, 0))
+    spans.append(data[literal_start:])
+    return b"".join(spans)
+
+
+def rle_decode(blob, size):
+    data = bytearray(size)
+    view = memoryview(blob)
+    src = 0
+    dst = 0
+    while src < len(view):
+        literal, transparent = RLE_SPAN.unpack_from(view, src)
+        src += RLE_SPAN.size
+        length = literal * 4
+        data[dst:dst + length] = view[src:src + length]
+        src += length
+        dst += length + transparent * 4
+    return data
+
+
+class PackWriter:
+    # Writes frames one after the other, the index goes at the end once all
+    # frame offsets are known
+
+    def __init__(self, path, encoding=ENCODING_RAW, size=None):
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, "wb")
+        self.file.write(b"\0" * HEADER.size)
+        self.entries = []
+        # Canvas size, grown to fit raw key frames
+        self.width = size.width() if size is not None else 0
+        self.height = size.height() if size is not None else 0
+        self.size = HEADER.size
+
+    def add(self, frame):
+        if frame.key and frame.patches[0][:2] == (0, 0):
+            image = frame.patches[0][2].convertToFormat(FRAME_FORMAT)
+            data = image.constBits().tobytes()
+            encoding = self.encoding
+            if encoding == ENCODING_RLE:
+                data = rle_encode(data)
+            entry = (image.width(), image.height(), image.bytesPerLine(), encoding)
+            self.width = max(self.width, image.width())
+            self.height = max(self.height, image.height())
+        else:
+            patches = [
+                (x, y, image.convertToFormat(FRAME_FORMAT))
+                for x, y, image in frame.patches
+            ]
+            chunks = [DELTA_COUNT.pack(len(patches))]
+            for x, y, image in patches:
+                chunks.append(DELTA_PATCH.pack(x, y, image.width(), image.height()))
+            for _, _, image in patches:
+                chunks.append(image.constBits().tobytes())
+            data = b"".join(chunks)
+            entry = (0, 0, 0, ENCODING_KEY_DELTA if frame.key else ENCODING_DELTA)
+
+        padding = -self.size % PACK_ALIGN
+        self.file.write(b"\0" * padding)
+        self.size += padding
+
+        self.entries.append((self.size, len(data)) + entry)
+        self.file.write(data)
+        self.size += len(data)
+
+    def close(self):
+        index_offset = self.size
+        for entry in self.entries:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(
+            PACK_MAGIC,
+            PACK_VERSION,
+            0,
+            len(self.entries),
+            self.width,
+            self.height,
+            index_offset,
+        ))
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PackReader:
+    # Maps a packed animation in memory. Raw frames are returned as QImages
+    # over the mapping itself, so opening a pack costs page faults, not copies.
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        try:
+            magic, version, _, frame_count, width, height, index_offset = HEADER.unpack_from(self.view, 0)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise PackError(f"{path} is not a supported animation pack")
+            self.frames = [
+                INDEX_ENTRY.unpack_from(self.view, index_offset + i * INDEX_ENTRY.size)
+                for i in range(frame_count)
+            ]
+        except struct.error:
+            self.close()
+            raise PackError(f"{path} is truncated")
+        except PackError:
+            self.close()
+            raise
+
+        self.frame_count = frame_count
+        self.frame_size = QSize(width, height)
+        self.needs_scaling = False
+
+    def load(self, index):
+        offset, length, width, height, bytes_per_line, encoding = self.frames[index]
+        blob = self.view[offset:offset + length]
+        if encoding in (ENCODING_DELTA, ENCODING_KEY_DELTA):
+            return self.load_delta(blob, encoding == ENCODING_KEY_DELTA)
+        if encoding == ENCODING_RLE:
+            blob = rle_decode(blob, bytes_per_line * height)
+        # QImage keeps a reference on the buffer it wraps
+        return key_frame(QImage(blob, width, height, bytes_per_line, FRAME_FORMAT))
+
+    def load_delta(self, blob, key=False):
+        (count,) = DELTA_COUNT.unpack_from(blob, 0)
+        data_offset = DELTA_COUNT.size + count * DELTA_PATCH.size
+        patches = []
+        for i in range(count):
+            x, y, width, height = DELTA_PATCH.unpack_from(blob, DELTA_COUNT.size + i * DELTA_PATCH.size)
+            length = width * height * 4
+            patch = blob[data_offset:data_offset + length]
+            patches.append((x, y, QImage(patch, width, height, width * 4, FRAME_FORMAT)))
+            data_offset += length
+        return Frame(patches, key)
+
+    def close(self):
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            # Frames still wrap the mapping, it is unmapped with the last one
+            pass
+
+
+def pack_folder(image_folder, output_path=None, size=None, encoding=ENCODING_RAW):
+    # Offline step: turn a folder of WebP frames into a packed animation,
+    # from its optimized version when there is one
+    output_path = output_path or pack_path(image_folder)
+    manifest = read_manifest(image_folder)
+    if manifest is not None:
+        frames = manifest.frames
+        canvas = QImage(manifest.canvas, FRAME_FORMAT)
+        canvas.fill(Qt.transparent)
+    else:
+        frames = [(img_path, None) for img_path in list_frames(image_folder)]
+    # Cropped key frames do not tell the canvas size
+    writer = PackWriter(output_path, encoding, manifest.canvas if manifest is not None and size is None else None)
+    encoder = DeltaEncoder()
+    previous = None
+    try:
+        for index, entry in enumerate(frames):
+            if entry is None:
+                # Held frame
+                writer.add(encoder.encode(None))
+                continue
+            img_path, rect = entry
+            if img_path is None:
+                # Empty frame, the whole canvas is cleared
+                canvas.fill(Qt.transparent)
+                image = canvas
+                previous = rect = None
+            else:
+                image = QImage(str(img_path))
+                if image.isNull():
+                    writer.add(encoder.encode(None))
+                    continue
+            if rect is not None:
+                image = manifest.crop(index, image)
+                place_image(canvas, image.convertToFormat(FRAME_FORMAT), rect, previous)
+                image = canvas
+                previous = rect
+            if size is not None:
+                # Key frames are kept whole once scaled
+                image = image.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                rect = None
+            writer.add(encoder.encode(image.convertToFormat(FRAME_FORMAT), rect))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack an animation frame folder for zero-decode playback.")
+    parser.add_argument("folder", help="folder of numbered .webp or .png frames")
+    parser.add_argument("-o", "--output", help=f"output file (default: <folder>{PACK_SUFFIX})")
+    parser.add_argument("--size", help="pre-scale frames to WIDTHxHEIGHT")
+    parser.add_argument("--rle", action="store_true", help="run-length encode transparent pixels of key frames")
+    args = parser.parse_args()
+
+    size = None
+    if args.size:
+        width, height = args.size.lower().split("x")
+        size = QSize(int(width), int(height))
+
+    encoding = ENCODING_RLE if args.rle else ENCODING_RAW
+    output_path = pack_folder(args.folder, args.output, size, encoding)
+    print(f"{output_path}: {os.path.getsize(output_path) / (1024 * 1024):.1f} MB")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,957 @@
+import os
+import json
+import math
+import time
+import queue
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtGui import QImage, QImageReader, QPainter
+from PySide6.QtCore import Qt, QRect
+
+from delta import DeltaEncoder, Frame, draw_frame, key_frame
+from framepack import (
+    FRAME_FORMAT,
+    PackError,
+    PackReader,
+    PackWriter,
+    list_frames,
+    pack_path,
+    place_image,
+    read_manifest,
+)
+
+
+def source_files(image_folder):
+    # A packed animation replaces the WebP frames of its folder, and so does
+    # an optimized one
+    packed = Path(pack_path(image_folder))
+    if packed.exists():
+        return [packed]
+    manifest = read_manifest(image_folder)
+    if manifest is not None:
+        return [Path(manifest.path)] + manifest.image_files()
+    return list_frames(image_folder)
+
+
+def frame_files(image_folder):
+    # File of each frame in play order, None where the previous frame holds
+    manifest = read_manifest(image_folder)
+    if manifest is not None:
+        return manifest.frame_files()
+    return list_frames(image_folder)
+
+
+class StageTimings:
+    # Time spent in each loading stage (decode, scale, encode...), summed
+    # over all frames and all worker threads. Each frame's time is also
+    # recorded in `metrics` when given.
+
+    def __init__(self, metrics=None):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.counts = {}
+        self.metrics = metrics
+
+    def add(self, stage, started):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + elapsed
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+        if self.metrics is not None:
+            self.metrics.observe(f"{stage}_ms", elapsed * 1000)
+
+    def report(self):
+        with self.lock:
+            return {
+                stage: {
+                    "count": self.counts[stage],
+                    "total_ms": round(total * 1000, 1),
+                    "mean_ms": round(total * 1000 / self.counts[stage], 2),
+                }
+                for stage, total in self.totals.items()
+            }
+
+
+# Largest source step tried when lining cropped frames up with the target
+# pixels, scales without one are only approximated at crop edges
+MAX_SCALE_STEP = 64
+# Decoding threads used by default. Each holds scaled frames in flight, and
+# every screen size has its own pool.
+MAX_DEFAULT_WORKERS = 4
+
+
+def default_workers():
+    return min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS)
+
+
+def scale_image(image, size, mode=Qt.KeepAspectRatio):
+    # QImage (unlike QPixmap) is safe to use outside the GUI thread
+    scaled_image = image.scaled(size, mode, Qt.SmoothTransformation)
+    return scaled_image.convertToFormat(FRAME_FORMAT)
+
+
+def scale_span(start, end, from_length, to_length):
+    # Widen [start, end) to the smallest step of the source that scales to
+    # whole target pixels, so a cropped part is filtered exactly like the
+    # same part of the whole image. Returns the source and target spans.
+    scale = to_length / from_length
+    step = 1
+    for candidate in range(1, MAX_SCALE_STEP + 1):
+        if abs(candidate * scale - round(candidate * scale)) < 1e-6:
+            step = candidate
+            break
+    start = start // step * step
+    end = min(from_length, -(-end // step) * step)
+    target_start = math.floor(start * scale + 1e-6)
+    target_end = min(to_length, max(target_start + 1, math.ceil(end * scale - 1e-6)))
+    return start, end, target_start, target_end
+
+
+def scale_rect(rect, from_size, to_size):
+    # Source rectangle around `rect` and where it goes on the scaled canvas
+    left, right, target_left, target_right = scale_span(
+        rect.x(), rect.x() + rect.width(), from_size.width(), to_size.width()
+    )
+    top, bottom, target_top, target_bottom = scale_span(
+        rect.y(), rect.y() + rect.height(), from_size.height(), to_size.height()
+    )
+    return (
+        QRect(left, top, right - left, bottom - top),
+        QRect(target_left, target_top, target_right - target_left, target_bottom - target_top),
+    )
+
+
+def load_scaled_image(img_path, size, timings=None):
+    # Decode a single frame and scale it to fit the target size. Qt releases
+    # the GIL while decoding and scaling, so this scales across threads.
+    started = time.perf_counter()
+    image = QImage(str(img_path))
+    if timings is not None:
+        timings.add("decode", started)
+    if image.isNull():
+        return None
+
+    started = time.perf_counter()
+    image = scale_image(image, size)
+    if timings is not None:
+        timings.add("scale", started)
+    return image
+
+
+class DecodedStore:
+    # Decodes each frame of an animation folder once for all the sources
+    # scaling it to different screen sizes. A decoded image is dropped as
+    # soon as every one of those sources has taken it, so sources playing
+    # together only hold the frames between the slowest and the fastest.
+    # A source leaving frames out says so with skip().
+
+    def __init__(self, image_files, timings=None):
+        self.image_files = list(image_files)
+        self.timings = timings
+        self.lock = threading.Lock()
+        self.users = set()
+        # User -> index of the first frame it still takes
+        self.floors = {}
+        # Index -> (decoded event, [image], users still to take it)
+        self.entries = {}
+
+    def add_user(self, user):
+        # Every user must be added before the first frame is decoded
+        with self.lock:
+            self.users.add(user)
+
+    def image(self, index, user):
+        with self.lock:
+            entry = self.entries.get(index)
+            decoding = entry is None
+            if decoding:
+                waiting = {other for other in self.users if self.floors.get(other, 0) <= index}
+                entry = self.entries[index] = (threading.Event(), [None], waiting)
+
+        decoded, image, waiting = entry
+        if decoding:
+            started = time.perf_counter()
+            decoded_image = QImage(str(self.image_files[index]))
+            if self.timings is not None:
+                self.timings.add("decode", started)
+            image[0] = None if decoded_image.isNull() else decoded_image
+            decoded.set()
+        else:
+            decoded.wait()
+
+        with self.lock:
+            waiting.discard(user)
+            if not waiting:
+                self.entries.pop(index, None)
+        return image[0]
+
+    def skip(self, user, index):
+        # `user` takes no frame before `index` any more
+        with self.lock:
+            self.floors[user] = index
+            self.drop(user, index)
+
+    def release(self, user):
+        # A user stopping early no longer holds frames back
+        with self.lock:
+            self.users.discard(user)
+            self.floors.pop(user, None)
+            self.drop(user, len(self.image_files))
+
+    def drop(self, user, index):
+        for entry_index, (decoded, _, waiting) in list(self.entries.items()):
+            if entry_index >= index:
+                continue
+            waiting.discard(user)
+            if not waiting and decoded.is_set():
+                del self.entries[entry_index]
+
+
+class FolderSource:
+    # Frames decoded from the WebP files of an animation folder. Decoding and
+    # scaling run on a thread pool a few frames ahead. Frames are delta
+    # encoded, which needs the previous frame so it stays in order, and
+    # stored for next time when a cache writer is attached. A `streamed`
+    # source makes key frames instead, so a player falling behind can leave
+    # frames out and the frames are not compared on the way. With a decoded
+    # store, frames are decoded once for every screen size and only scaled
+    # here. With the manifest of an optimized folder, only the cropped part of
+    # each frame is scaled, and decoded too unless its file was kept
+    # uncropped, and held frames cost nothing.
+    # `lookahead` caps the frames decoded ahead, a streaming player passes
+    # its ring size so the frames in flight stay bounded too.
+
+    def __init__(
+        self,
+        image_files,
+        size,
+        writer=None,
+        workers=None,
+        timings=None,
+        store=None,
+        manifest=None,
+        lookahead=None,
+        streamed=False,
+    ):
+        self.image_files = list(image_files)
+        self.size = size
+        self.writer = writer
+        self.streamed = streamed
+        # Only key frames can be left out
+        self.skippable = streamed
+        self.store = store
+        self.manifest = manifest
+        # Full frame the cropped images are placed on for delta encoding, and
+        # where the last one went
+        self.canvas = None
+        self.placed = None
+        # Last frame loaded
+        self.loaded = -1
+        if store is not None:
+            store.add_user(self)
+        self.frame_count = len(self.image_files)
+        self.needs_scaling = True
+        self.encoder = DeltaEncoder()
+        self.timings = timings if timings is not None else StageTimings()
+
+        self.workers = workers or default_workers()
+        self.executor = None
+        if self.workers > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.lookahead = 2 * self.workers
+        if lookahead:
+            self.lookahead = min(self.lookahead, lookahead)
+        # Index -> future of the decoded and scaled image
+        self.decoding = {}
+        self.next_decode = 0
+
+        # Only the header of the first file is read to size the canvas
+        self.frame_size = size
+        if manifest is not None:
+            self.frame_size = manifest.canvas.scaled(size, Qt.KeepAspectRatio)
+        elif self.image_files:
+            source_size = QImageReader(str(self.image_files[0])).size()
+            if source_size.isValid():
+                self.frame_size = source_size.scaled(size, Qt.KeepAspectRatio)
+
+    def load(self, index):
+        source_index = index
+        if index > self.loaded + 1:
+            # Frames were left out. A held frame shows the image it holds,
+            # unless that one was loaded already.
+            if self.manifest is not None and self.image_files[index] is None and not self.manifest.is_empty(index):
+                base = index
+                while self.manifest.frames[base] is None:
+                    base -= 1
+                if base > self.loaded:
+                    source_index = base
+            if self.store is not None:
+                self.store.skip(self, source_index)
+        self.loaded = index
+
+        image = self.decode(source_index)
+        started = time.perf_counter()
+        if self.manifest is not None and (image is not None or self.manifest.is_empty(source_index)):
+            frame = self.encode_placed(source_index, image)
+        else:
+            frame = self.encode(image)
+        self.timings.add("encode", started)
+        if self.writer is not None:
+            self.writer.add(index, frame)
+        return frame
+
+    def encode(self, image, bounds=None):
+        if not self.streamed:
+            return self.encoder.encode(image, bounds)
+        if image is None:
+            # Undecodable frame, keep showing the previous one
+            return Frame([])
+        return key_frame(image, bounds)
+
+    def encode_placed(self, index, image):
+        # Key frames only keep the cropped part, the rest is cleared. Without
+        # an image, the frame is empty and the whole canvas is cleared.
+        if self.canvas is None:
+            self.canvas = QImage(self.frame_size, FRAME_FORMAT)
+            self.canvas.fill(Qt.transparent)
+            self.placed = QRect()
+        if image is None:
+            self.canvas.fill(Qt.transparent)
+            self.placed = QRect()
+            if self.streamed:
+                # A key frame without patches clears the canvas
+                return Frame([], key=True)
+            return self.encoder.encode(self.canvas)
+        _, rect = self.placed_rects(index)
+        place_image(self.canvas, image, rect, self.placed)
+        self.placed = rect
+        # Only the cropped part is copied, the canvas can be reused
+        return self.encode(self.canvas, rect)
+
+    def placed_rects(self, index):
+        # Part of the source canvas scaled for a frame, and where it goes
+        _, rect = self.manifest.frames[index]
+        return scale_rect(rect, self.manifest.canvas, self.frame_size)
+
+    def scale_cropped(self, index, image):
+        _, rect = self.manifest.frames[index]
+        source, target = self.placed_rects(index)
+        image = self.manifest.crop(index, image)
+        if source != rect:
+            # Pad the crop with transparent pixels up to the source rectangle
+            padded = QImage(source.size(), FRAME_FORMAT)
+            place_image(padded, image.convertToFormat(FRAME_FORMAT), rect.translated(-source.topLeft()))
+            image = padded
+        return scale_image(image, target.size(), Qt.IgnoreAspectRatio)
+
+    def load_image(self, index):
+        if self.image_files[index] is None:
+            # Held frame of an optimized folder
+            return None
+        if self.store is None and self.manifest is None:
+            return load_scaled_image(self.image_files[index], self.size, self.timings)
+
+        if self.store is not None:
+            image = self.store.image(index, self)
+        else:
+            started = time.perf_counter()
+            image = QImage(str(self.image_files[index]))
+            self.timings.add("decode", started)
+        if image is None or image.isNull():
+            return None
+        started = time.perf_counter()
+        if self.manifest is None:
+            image = scale_image(image, self.size)
+        else:
+            image = self.scale_cropped(index, image)
+        self.timings.add("scale", started)
+        return image
+
+    def decode(self, index):
+        if self.executor is None:
+            return self.load_image(index)
+
+        # Frames left out are not decoded
+        for skipped in [skipped for skipped in self.decoding if skipped < index]:
+            self.decoding.pop(skipped).cancel()
+        # Keep every worker busy on the frames coming next, a bounded number
+        # of them so memory does not grow with the clip length
+        self.next_decode = max(self.next_decode, index)
+        while self.next_decode < min(self.frame_count, index + self.lookahead):
+            self.decoding[self.next_decode] = self.executor.submit(self.load_image, self.next_decode)
+            self.next_decode += 1
+        future = self.decoding.pop(index, None)
+        if future is None:
+            return self.load_image(index)
+        return future.result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.decoding.clear()
+        if self.store is not None:
+            self.store.release(self)
+        if self.writer is not None:
+            self.writer.commit()
+            self.writer = None
+
+
+class PackSource:
+    # Frames of a packed animation. When the pack was made for this screen
+    # size they are used straight from the map, otherwise each frame is
+    # rebuilt at pack resolution, scaled, and delta encoded again, or made
+    # a key frame when `streamed`. Frames build on each other in the pack,
+    # none can be left out.
+
+    def __init__(self, reader, size, writer=None, streamed=False):
+        self.reader = reader
+        self.size = size
+        self.writer = writer
+        self.streamed = streamed
+        self.frame_count = reader.frame_count
+        self.frame_size = reader.frame_size.scaled(size, Qt.KeepAspectRatio)
+        self.needs_scaling = self.frame_size != reader.frame_size
+        self.canvas = None
+        self.encoder = DeltaEncoder()
+        self.skippable = False
+
+    def load(self, index):
+        frame = self.reader.load(index)
+        if self.needs_scaling:
+            if self.canvas is None:
+                self.canvas = QImage(self.reader.frame_size, FRAME_FORMAT)
+                self.canvas.fill(Qt.transparent)
+            painter = QPainter(self.canvas)
+            draw_frame(painter, frame)
+            painter.end()
+            image = scale_image(self.canvas, self.size)
+            if self.streamed:
+                frame = key_frame(image)
+            else:
+                frame = self.encoder.encode(image)
+        if self.writer is not None:
+            self.writer.add(index, frame)
+        return frame
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.commit()
+            self.writer = None
+        self.reader.close()
+
+
+class FrameCacheWriter:
+    # Collects the frames of one cache entry as they are decoded. The entry is
+    # only published if every frame was seen, in order, within the size cap.
+
+    def __init__(self, cache, key, content_hash, frame_count, frame_size):
+        self.cache = cache
+        self.key = key
+        self.content_hash = content_hash
+        self.frame_count = frame_count
+        self.data_path = cache.data_path(key) + ".tmp"
+        self.pack = PackWriter(self.data_path, size=frame_size)
+        self.frames_added = 0
+        self.valid = True
+
+    def add(self, index, frame):
+        if not self.valid:
+            return
+        if index != self.frames_added:
+            # Frames were skipped, the entry would be incomplete
+            self.discard()
+            return
+
+        self.pack.add(frame)
+        self.frames_added += 1
+        if self.pack.size > self.cache.max_bytes:
+            self.discard()
+
+    def commit(self):
+        if not self.valid:
+            return
+        if self.frames_added != self.frame_count:
+            self.discard()
+            return
+        self.valid = False
+        self.pack.close()
+        try:
+            os.replace(self.data_path, self.cache.data_path(self.key))
+        except OSError:
+            # The previous entry is still mapped by a player (Windows)
+            os.remove(self.data_path)
+            self.cache.filled(self.key)
+            return
+        self.cache.write_meta(self.key, {"hash": self.content_hash})
+        self.cache.evict()
+        self.cache.filled(self.key)
+
+    def discard(self):
+        if not self.valid:
+            return
+        self.valid = False
+        self.pack.abort()
+        self.cache.filled(self.key)
+
+
+class FrameCache:
+    # On-disk cache of frames already scaled for a given screen, stored as raw
+    # animation packs so they can be mapped back without decoding. Entries
+    # are keyed by (animation name, contents, screen size, device pixel ratio),
+    # so an animation that changes gets new entries and the old ones are
+    # evicted in time. Streaming players do not write entries as they play,
+    # which would keep them from leaving late frames out: missing entries are
+    # filled afterwards on threads of the cache, which close() stops.
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Keys of the entries being written, each by a single writer
+        self.filling = set()
+        self.filling_changed = threading.Condition(self.lock)
+        # Threads filling entries in the background, held back while
+        # something is playing
+        self.fills = set()
+        self.paused = 0
+        self.closing = threading.Event()
+        # Folder -> (signature, content hash), so contents are hashed once
+        # while the files do not change
+        self.hashes = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Entries a killed process was still writing
+        for tmp_path in Path(self.cache_dir).glob("*.tmp"):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def entry_key(self, image_folder, size, dpr):
+        # Not the absolute folder: a one-file build unpacks the animations to
+        # a new temporary folder on every launch
+        name = os.path.basename(os.path.normpath(image_folder))
+        raw_key = f"{name}|{self.folder_hash(image_folder)}|{size.width()}x{size.height()}@{dpr}"
+        return hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+    def data_path(self, key):
+        return os.path.join(self.cache_dir, key + ".ntpack")
+
+    def meta_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def source_list(self, image_files):
+        # Cheap signature of the source files, checked on every open
+        sources = []
+        for img_path in image_files:
+            stat = os.stat(img_path)
+            sources.append((img_path.name, stat.st_size, stat.st_mtime_ns))
+        return sources
+
+    def folder_hash(self, image_folder):
+        folder = os.path.abspath(image_folder)
+        image_files = source_files(image_folder)
+        sources = self.source_list(image_files)
+        with self.lock:
+            known = self.hashes.get(folder)
+        if known is not None and known[0] == sources:
+            return known[1]
+        content_hash = self.content_hash(image_files)
+        with self.lock:
+            self.hashes[folder] = (sources, content_hash)
+        return content_hash
+
+    def content_hash(self, image_files):
+        # Expensive signature, only computed when the cheap one changed
+        digest = hashlib.sha1()
+        for img_path in image_files:
+            digest.update(img_path.name.encode("utf-8"))
+            with open(img_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def read_meta(self, key):
+        try:
+            with open(self.meta_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, key, meta):
+        with self.lock:
+            tmp_path = self.meta_path(key) + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self.meta_path(key))
+
+    def remove(self, key):
+        for path in (self.meta_path(key), self.data_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                # Missing, or still mapped by a player on Windows
+                pass
+
+    def has_entry(self, key):
+        return self.read_meta(key) is not None and os.path.exists(self.data_path(key))
+
+    def open(
+        self,
+        image_folder,
+        size,
+        dpr=1.0,
+        workers=None,
+        timings=None,
+        store=None,
+        lookahead=None,
+        streamed=False,
+    ):
+        # Return a source reading from the cache, or a source decoding the
+        # animation, and unless `streamed`, filling the cache as it goes
+        key = self.entry_key(image_folder, size, dpr)
+        if self.has_entry(key):
+            try:
+                reader = PackReader(self.data_path(key))
+            except (OSError, PackError):
+                reader = None
+            if reader is not None:
+                # Keep the entry recently used for eviction
+                os.utime(self.meta_path(key))
+                return reader
+
+        self.remove(key)
+        source = open_source(
+            image_folder,
+            size,
+            workers=workers,
+            timings=timings,
+            store=store,
+            lookahead=lookahead,
+            streamed=streamed,
+        )
+        if not streamed and source.frame_count and source.needs_scaling and self.start_filling(key):
+            source.writer = FrameCacheWriter(
+                self,
+                key,
+                self.folder_hash(image_folder),
+                source.frame_count,
+                source.frame_size,
+            )
+        return source
+
+    def start_filling(self, key):
+        # False while another source is still writing the entry
+        with self.filling_changed:
+            if key in self.filling:
+                return False
+            self.filling.add(key)
+            return True
+
+    def filled(self, key):
+        with self.filling_changed:
+            self.filling.discard(key)
+            self.filling_changed.notify_all()
+
+    def wait_filled(self, timeout=None):
+        # Block until no entry is being written, False on timeout
+        with self.filling_changed:
+            return self.filling_changed.wait_for(lambda: not self.filling and not self.fills, timeout)
+
+    def fill(self, image_folder, sizes, workers=None):
+        # Write the entries of `image_folder` missing for `sizes`, (size, dpr)
+        # pairs, on a thread of the cache
+        sizes = list(sizes)
+        keys = [self.entry_key(image_folder, size, dpr) for size, dpr in sizes]
+        with self.filling_changed:
+            if self.closing.is_set() or all(key in self.filling or self.has_entry(key) for key in keys):
+                return
+            thread = threading.Thread(target=self.run_fill, args=(image_folder, sizes, workers), daemon=True)
+            self.fills.add(thread)
+            thread.start()
+
+    def run_fill(self, image_folder, sizes, workers):
+        sources = []
+        try:
+            # Frame by frame across the sizes, so each frame is decoded once
+            # and dropped as soon as every size has scaled it
+            store = DecodedStore(frame_files(image_folder)) if len(sizes) > 1 else None
+            for size, dpr in sizes:
+                source = self.open(image_folder, size, dpr, workers, store=store)
+                if getattr(source, "writer", None) is None:
+                    # Already there, or being written by another source
+                    source.close()
+                else:
+                    sources.append(source)
+            frame_count = min((source.frame_count for source in sources), default=0)
+            for index in range(frame_count):
+                with self.filling_changed:
+                    self.filling_changed.wait_for(lambda: not self.paused or self.closing.is_set())
+                if self.closing.is_set():
+                    break
+                for source in sources:
+                    source.load(index)
+        finally:
+            # An incomplete entry is discarded along with its file
+            for source in sources:
+                source.close()
+            with self.filling_changed:
+                self.fills.discard(threading.current_thread())
+                self.filling_changed.notify_all()
+
+    def pause(self):
+        # Hold background fills back while an animation plays, they would
+        # compete with it for the CPU
+        with self.filling_changed:
+            self.paused += 1
+
+    def resume(self):
+        with self.filling_changed:
+            self.paused -= 1
+            self.filling_changed.notify_all()
+
+    def close(self):
+        # Give up on the entries still being filled and wait for their
+        # threads, before the app goes away
+        with self.filling_changed:
+            self.closing.set()
+            self.filling_changed.notify_all()
+            fills = list(self.fills)
+        for thread in fills:
+            thread.join()
+
+    def evict(self):
+        # Drop least recently used entries until the cache fits its size cap
+        with self.lock:
+            entries = []
+            total = 0
+            for meta_file in Path(self.cache_dir).glob("*.json"):
+                data_file = meta_file.with_suffix(".ntpack")
+                if not data_file.exists():
+                    continue
+                size = data_file.stat().st_size
+                entries.append((meta_file.stat().st_mtime, meta_file.stem, size))
+                total += size
+
+            entries.sort()
+            for _, key, size in entries:
+                if total <= self.max_bytes:
+                    break
+                self.remove(key)
+                total -= size
+
+
+def open_source(
+    image_folder,
+    size,
+    cache=None,
+    dpr=1.0,
+    workers=None,
+    timings=None,
+    store=None,
+    lookahead=None,
+    streamed=False,
+):
+    # Sources opened with the same decoded store share the decoding of the
+    # folder frames. A `streamed` source is played as it loads: it makes key
+    # frames and leaves the cache entry to a fill afterwards.
+    if cache is not None:
+        return cache.open(image_folder, size, dpr, workers, timings, store, lookahead, streamed)
+    packed = pack_path(image_folder)
+    if os.path.exists(packed):
+        try:
+            return PackSource(PackReader(packed), size, streamed=streamed)
+        except (OSError, PackError) as error:
+            # Truncated, from another version or unreadable: the frames
+            # are decoded from the folder instead
+            if timings is not None and timings.metrics is not None:
+                timings.metrics.inc("pack_errors")
+                timings.metrics.event("pack_error", path=packed, error=str(error))
+    manifest = read_manifest(image_folder)
+    if store is not None:
+        image_files = store.image_files
+    elif manifest is not None:
+        image_files = manifest.frame_files()
+    else:
+        image_files = list_frames(image_folder)
+    return FolderSource(
+        image_files,
+        size,
+        workers=workers,
+        timings=timings,
+        store=store,
+        manifest=manifest,
+        lookahead=lookahead,
+        streamed=streamed,
+    )
+
+
+class PrefetchedSource:
+    # Wraps a source whose first `limit` frames are loaded ahead of time on a
+    # worker thread, so an upcoming animation is ready when its cue comes.
+    # Each prefetched frame is dropped as soon as it is handed out.
+    # `on_ready` is called from the worker thread once all of them are loaded.
+
+    def __init__(self, source, image_folder, size, limit=None, on_ready=None):
+        self.source = source
+        self.image_folder = image_folder
+        self.size = size
+        self.frame_count = source.frame_count
+        self.frame_size = source.frame_size
+        self.needs_scaling = source.needs_scaling
+        self.limit = self.frame_count if limit is None else min(limit, self.frame_count)
+        self.on_ready = on_ready
+
+        self.frames = {}
+        self.loaded = 0
+        self.cancelled = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        for index in range(self.limit):
+            if self.cancelled:
+                break
+            frame = self.source.load(index)
+            with self.condition:
+                self.frames[index] = frame
+                self.loaded = index + 1
+                self.condition.notify_all()
+        with self.condition:
+            # Wake up a reader waiting on a cancelled prefetch
+            self.limit = self.loaded
+            self.condition.notify_all()
+        if self.on_ready is not None and not self.cancelled:
+            self.on_ready()
+
+    @property
+    def writer(self):
+        return getattr(self.source, "writer", None)
+
+    @property
+    def skippable(self):
+        return getattr(self.source, "skippable", False)
+
+    def matches(self, image_folder, size):
+        return self.image_folder == image_folder and self.size == size
+
+    def load(self, index):
+        # Frames must be read in order, like from any other source
+        with self.condition:
+            while index >= self.loaded and index < self.limit:
+                self.condition.wait()
+            if index < self.loaded:
+                return self.frames.pop(index)
+        # Past the prefetched part, continue from the underlying source
+        self.thread.join()
+        return self.source.load(index)
+
+    def close(self):
+        self.cancelled = True
+        self.thread.join()
+        self.frames.clear()
+        self.source.close()
+
+
+class FrameStream:
+    # Loads frames from a source a few ahead of the play head on a worker
+    # thread. At most `ring_size` ready frames are held at any time, so memory
+    # stays bounded whatever the clip length or screen resolution.
+    # `on_frame` is called from the worker thread each time a frame, or the
+    # end of the clip, lands in the ring. When the source can leave frames
+    # out, those that would already be late are not loaded at all.
+
+    def __init__(self, source, ring_size=8, on_frame=None):
+        self.source = source
+        self.on_frame = on_frame
+        self.ring = queue.Queue(maxsize=max(1, ring_size))
+
+        # Next frame handed out by the ring but not yet due on screen
+        self.pending = None
+        # Index of the last frame handed to the GUI
+        self.taken_index = -1
+        # Latest frame index requested by the GUI
+        self.play_head = 0
+        self.finished = False
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        index = 0
+        try:
+            while index < self.source.frame_count:
+                if self.stop_event.is_set():
+                    return
+                if index < self.play_head and getattr(self.source, "skippable", False):
+                    # Frames already due would be late, load the current one
+                    index = min(self.play_head, self.source.frame_count - 1)
+                frame = self.source.load(index)
+                index += 1
+                if not self.put((index - 1, frame)):
+                    return
+            # End of clip marker
+            self.put(None)
+        finally:
+            self.source.close()
+
+    def put(self, item):
+        # Block while the ring is full, waking up regularly to honour stop()
+        while not self.stop_event.is_set():
+            try:
+                self.ring.put(item, timeout=0.1)
+                if self.on_frame is not None:
+                    self.on_frame()
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def ready(self):
+        # Whether the next frame is loaded, without waiting for it, so
+        # playback starts on a frame
+        if self.pending is None and not self.finished:
+            try:
+                self.pending = self.ring.get_nowait()
+            except queue.Empty:
+                return False
+            if self.pending is None:
+                self.finished = True
+        return self.pending is not None
+
+    def take(self, frame_index):
+        # Return every ready frame due up to `frame_index`, in order
+        self.play_head = frame_index
+        frames = []
+        while not self.finished:
+            if self.pending is None:
+                try:
+                    self.pending = self.ring.get_nowait()
+                except queue.Empty:
+                    break
+            if self.pending is None:
+                self.finished = True
+                break
+            index, frame = self.pending
+            if index > frame_index:
+                break
+            frames.append(frame)
+            self.taken_index = index
+            self.pending = None
+        return frames
+
+    def stop(self):
+        self.stop_event.set()
+        self.pending = None
+        # Drain the ring so a blocked worker can notice the stop request
+        while True:
+            try:
+                self.ring.get_nowait()
+            except queue.Empty:
+                break
+        # The worker stops after the frame it is loading
+        self.thread.join()
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 16, 25, 33, 50, 66, 100, 250, 500, 1000, 5000)
+
+# A rotated JSON lines file keeps this many older files next to it
+JSONL_MAX_BYTES = 1024 * 1024
+JSONL_BACKUPS = 3
+
+# Events kept in memory for the metrics window
+RECENT_EVENTS = 20
+
+
+class Histogram:
+    def __init__(self):
+        # One count per bucket, plus one past the last bound
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the quantile
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def report(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "max": round(self.max, 3),
+            "buckets": dict(zip([str(bound) for bound in BUCKETS_MS] + ["inf"], self.counts)),
+        }
+
+
+class NullMetrics:
+    # Stands in for Metrics when they are disabled, every call does nothing
+
+    enabled = False
+    path = None
+
+    def observe(self, name, value):
+        pass
+
+    def inc(self, name, value=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def event(self, kind, **fields):
+        pass
+
+    def flush(self):
+        pass
+
+    def summary(self):
+        return "Metrics are disabled, turn them on in the settings."
+
+
+class Metrics(NullMetrics):
+    # Counters, gauges and millisecond histograms, updated from any thread and
+    # written to a sink on flush
+
+    enabled = True
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.path = sink.path
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        # Events not written yet, and the last few for display
+        self.events = []
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self.dirty = False
+
+    def observe(self, name, value):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+            self.dirty = True
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self.dirty = True
+
+    def set(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+            self.dirty = True
+
+    def event(self, kind, **fields):
+        record = {"time": round(time.time(), 3), "kind": kind}
+        record.update(fields)
+        with self.lock:
+            self.events.append(record)
+            self.recent.append(record)
+            self.dirty = True
+
+    def snapshot(self):
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {name: histogram.report() for name, histogram in self.histograms.items()},
+        }
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            events, self.events = self.events, []
+            snapshot = self.snapshot()
+            self.dirty = False
+        try:
+            self.sink.write(events, snapshot)
+        except OSError:
+            # Metrics must never take the app down
+            pass
+
+    def summary(self):
+        # Plain text view of everything recorded since startup
+        with self.lock:
+            lines = [f"Written to {self.path}", ""]
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name}: {value}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"{name}: {value}")
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(
+                    f"{name}: {histogram.count} samples, "
+                    f"mean {histogram.sum / histogram.count:.1f}, "
+                    f"p50 <= {histogram.quantile(0.5)}, "
+                    f"p95 <= {histogram.quantile(0.95)}, "
+                    f"max {histogram.max:.1f}"
+                )
+            if self.recent:
+                lines += ["", "Recent events:"]
+                lines += [json.dumps(record) for record in self.recent]
+        return "\n".join(lines)
+
+
+class JsonlSink:
+    # Appends events and a snapshot of all metrics as JSON lines, rotating
+    # the file once it grows past `max_bytes`
+
+    def __init__(self, path, max_bytes=JSONL_MAX_BYTES, backups=JSONL_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def write(self, events, snapshot):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            self.rotate()
+        snapshot_record = {"time": round(time.time(), 3), "kind": "snapshot"}
+        snapshot_record.update(snapshot)
+        with open(self.path, "a") as f:
+            for record in events + [snapshot_record]:
+                f.write(json.dumps(record) + "\n")
+
+
+class PrometheusSink:
+    # Rewrites a Prometheus textfile with the current metrics, for the node
+    # exporter textfile collector. Events only show in the metrics window.
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, events, snapshot):
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE notime_{name}_total counter")
+            lines.append(f"notime_{name}_total {value}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append(f"# TYPE notime_{name} gauge")
+            lines.append(f"notime_{name} {value}")
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE notime_{name} histogram")
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f'notime_{name}_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f"notime_{name}_sum {histogram['sum']}")
+            lines.append(f"notime_{name}_count {histogram['count']}")
+
+        # Replace the file at once so the collector never reads half of it
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.path)
+
+
+def create_metrics(sink, folder):
+    # `sink` is "off", "jsonl" or "prometheus"
+    if sink == "jsonl":
+        os.makedirs(folder, exist_ok=True)
+        return Metrics(JsonlSink(os.path.join(folder, "metrics.jsonl")))
+    if sink == "prometheus":
+        os.makedirs(folder, exist_ok=True)
+        return Metrics(PrometheusSink(os.path.join(folder, "notime.prom")))
+    return NullMetrics()
@@ -1,137 +1,83 @@
 import sys
 import os
-import datetime
 import json
-from pathlib import Path
+import time
+import argparse
+
+# Launch time, startup steps are profiled from here
+LAUNCHED = time.perf_counter()
 
 from PySide6.QtWidgets import (
     QApplication,
     QSystemTrayIcon,
     QMenu,
     QWidget,
-    QLabel,
-    QVBoxLayout,
     QStyle,
     QLineEdit,
     QPushButton,
     QFormLayout,
     QMessageBox,
+    QComboBox,
+    QCheckBox,
+    QPlainTextEdit,
+    QVBoxLayout,
 )
-from PySide6.QtGui import QIcon, QAction, QPixmap
+from PySide6.QtGui import QIcon, QAction, QDesktopServices
 from PySide6.QtCore import (
-    Qt,
-    QUrl,
     Slot,
     QObject,
     QTimer,
-    QElapsedTimer,
     QStandardPaths,
     QCoreApplication,
+    QUrl,
 )
-from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
-
+from audio import SoundPool
+from frames import FrameCache
+from metrics import create_metrics
+from playback import FullScreenAnimation
+from alerts import (
+    ALERT_TIERS,
+    FALLBACK_ALERTS,
+    FALLBACK_BAD_RUNS,
+    MAX_DROPPED_SHARE,
+    MAX_LATE_SHARE,
+    MESSAGES,
+    NOTIFICATION_MS,
+    CornerOverlay,
+    available_memory_mb,
+    cheaper_tier,
+)
+from control import ControlServer, send
+from cycle import CycleEngine
+from scheduler import DeadlineScheduler
+from stats import StatsStore, STATES, format_duration
 
-class FullScreenAnimation(QWidget):
-    def __init__(self, image_folder, sound_file=None, fps=30):
-        super().__init__()
+# Pending metrics are written this often, in seconds
+METRICS_FLUSH_SECONDS = 60
+# How often the period in progress is checkpointed in the statistics
+STATS_CHECKPOINT_SECONDS = 60
 
-        self.image_folder = image_folder
-        self.sound_file = sound_file
-        self.fps = fps
-        self.frame_duration = 1000 / self.fps  # Duration of each frame in milliseconds
 
-        # Window configuration
-        self.setWindowFlags(Qt.WindowStaysOnTopHint | Qt.FramelessWindowHint)
-        self.setAttribute(Qt.WA_TranslucentBackground)
-        self.showFullScreen()
+class StartupProfile:
+    # Time from launch to each startup step, printed with --profile-startup
 
-        # QLabel to display images
-        self.label = QLabel(self)
-        self.label.setAlignment(Qt.AlignCenter)
-        self.label.setStyleSheet("background-color: transparent;")
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.marks = []
 
-        # Layout setup
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.addWidget(self.label)
+    def mark(self, step):
+        if self.enabled:
+            self.marks.append((step, time.perf_counter()))
 
-        # Preload and scale images
-        self.pixmaps = self.load_and_scale_images()
-
-        if not self.pixmaps:
-            self.close()
+    def report(self):
+        if not self.enabled or not self.marks:
             return
-
-        self.total_frames = len(self.pixmaps)
-
-        # Start sound if available
-        self.start_sound()
-
-        # Start timer to update images
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_image)
-        self.timer.start(0)  # Start immediately
-
-        # Timer to track elapsed time
-        self.elapsed_timer = QElapsedTimer()
-        self.elapsed_timer.start()
-
-        # Connect destroyed signal for cleanup
-        self.destroyed.connect(self.cleanup)
-
-    def load_and_scale_images(self):
-        pixmaps = []
-        image_files = sorted(Path(self.image_folder).glob("*.webp"))
-        screen_size = self.screen().size()
-        for img_path in image_files:
-            pixmap = QPixmap(str(img_path))
-            if not pixmap.isNull():
-                # Pre-scale the image
-                scaled_pixmap = pixmap.scaled(
-                    screen_size,
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation,
-                )
-                pixmaps.append(scaled_pixmap)
-        return pixmaps
-
-    def start_sound(self):
-        if self.sound_file and os.path.exists(self.sound_file):
-            self.audio_output = QAudioOutput()
-            self.player = QMediaPlayer()
-            self.player.setAudioOutput(self.audio_output)
-            self.player.setSource(QUrl.fromLocalFile(self.sound_file))
-            self.player.play()
-        else:
-            self.player = None
-
-    def update_image(self):
-        # Calculate frame index based on elapsed time
-        elapsed_ms = self.elapsed_timer.elapsed()
-        frame_index = int(elapsed_ms / self.frame_duration)
-
-        if frame_index < self.total_frames:
-            self.label.setPixmap(self.pixmaps[frame_index])
-        else:
-            self.timer.stop()
-            self.end_animation()
-
-    def end_animation(self):
-        # Clear the label
-        self.label.clear()
-        # Close the window
-        self.close()
-
-    def cleanup(self):
-        # Clean up resources
-        if hasattr(self, "player") and self.player:
-            self.player.stop()
-            self.player.deleteLater()
-            del self.player
-        if hasattr(self, "audio_output"):
-            self.audio_output.deleteLater()
-            del self.audio_output
-        self.pixmaps.clear()
+        previous = LAUNCHED
+        print("Startup profile (ms since launch, ms for the step):", file=sys.stderr)
+        for step, at in self.marks:
+            print(f"  {(at - LAUNCHED) * 1000:8.1f} {(at - previous) * 1000:8.1f}  {step}", file=sys.stderr)
+            previous = at
+        self.marks = []
 
 
 class SettingsWindow(QWidget):
@@ -148,6 +94,37 @@ class SettingsWindow(QWidget):
         self.break_interval_2_input = QLineEdit(str(self.settings["break_intervals"][1] // 60))
         self.total_duration_input = QLineEdit(str(self.settings["total_duration"] // 3600))
 
+        # Animation quality: frames are kept at most this high and upscaled
+        # when painted
+        self.quality_input = QComboBox()
+        for label, height in (("Full", 0), ("High (1440p)", 1440), ("Medium (1080p)", 1080), ("Low (720p)", 720)):
+            self.quality_input.addItem(label, height)
+        self.quality_input.setCurrentIndex(max(0, self.quality_input.findData(self.settings["max_frame_height"])))
+        self.adaptive_quality_input = QCheckBox("Adapt quality when frames are late")
+        self.adaptive_quality_input.setChecked(self.settings["adaptive_quality"])
+        self.all_screens_input = QCheckBox("Show animations on all screens")
+        self.all_screens_input.setChecked(self.settings["all_screens"])
+
+        # How transitions are signalled, lighter alerts for slow machines
+        self.alert_input = QComboBox()
+        for label, tier in (("Full-screen animation", "animation"), ("Corner overlay", "overlay"), ("Notification", "notification")):
+            self.alert_input.addItem(label, tier)
+        self.alert_input.setCurrentIndex(max(0, self.alert_input.findData(self.settings["alert"])))
+        self.alert_fallback_input = QCheckBox("Use a lighter alert when frames are late or memory is low")
+        self.alert_fallback_input.setChecked(self.settings["alert_fallback"])
+
+        # Where runtime metrics go, if anywhere
+        self.metrics_input = QComboBox()
+        for label, sink in (("Off", "off"), ("JSON lines", "jsonl"), ("Prometheus textfile", "prometheus")):
+            self.metrics_input.addItem(label, sink)
+        self.metrics_input.setCurrentIndex(max(0, self.metrics_input.findData(self.settings["metrics"])))
+
+        # What happens with the 'counter' animation at launch
+        self.startup_input = QComboBox()
+        for label, mode in (("Load in background", "async"), ("Play right away", "play"), ("Skip", "skip")):
+            self.startup_input.addItem(label, mode)
+        self.startup_input.setCurrentIndex(max(0, self.startup_input.findData(self.settings["startup_animation"])))
+
         # Buttons
         self.save_button = QPushButton("Save Settings")
         self.restore_button = QPushButton("Restore Default Settings")
@@ -158,6 +135,13 @@ class SettingsWindow(QWidget):
         layout.addRow("Break 1 (minutes):", self.break_interval_1_input)
         layout.addRow("Break 2 (minutes):", self.break_interval_2_input)
         layout.addRow("Total Duration (hours):", self.total_duration_input)
+        layout.addRow("Animation Quality:", self.quality_input)
+        layout.addRow(self.adaptive_quality_input)
+        layout.addRow(self.all_screens_input)
+        layout.addRow("Alert:", self.alert_input)
+        layout.addRow(self.alert_fallback_input)
+        layout.addRow("Metrics:", self.metrics_input)
+        layout.addRow("Startup Animation:", self.startup_input)
         layout.addRow(self.save_button, self.restore_button)
         self.setLayout(layout)
 
@@ -175,6 +159,13 @@ class SettingsWindow(QWidget):
             self.settings["work_interval"] = work_interval
             self.settings["break_intervals"] = [break_interval_1, break_interval_2]
             self.settings["total_duration"] = total_duration
+            self.settings["max_frame_height"] = self.quality_input.currentData()
+            self.settings["adaptive_quality"] = self.adaptive_quality_input.isChecked()
+            self.settings["all_screens"] = self.all_screens_input.isChecked()
+            self.settings["alert"] = self.alert_input.currentData()
+            self.settings["alert_fallback"] = self.alert_fallback_input.isChecked()
+            self.settings["metrics"] = self.metrics_input.currentData()
+            self.settings["startup_animation"] = self.startup_input.currentData()
 
             # Save settings to configuration file
             self.parent.save_settings()
@@ -193,20 +184,124 @@ class SettingsWindow(QWidget):
         self.break_interval_1_input.setText("10")
         self.break_interval_2_input.setText("20")
         self.total_duration_input.setText("8")
+        self.quality_input.setCurrentIndex(0)
+        self.adaptive_quality_input.setChecked(True)
+        self.all_screens_input.setChecked(True)
+        self.alert_input.setCurrentIndex(0)
+        self.alert_fallback_input.setChecked(True)
+        self.metrics_input.setCurrentIndex(0)
+        self.startup_input.setCurrentIndex(0)
+
+
+class MetricsWindow(QWidget):
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+
+        self.setWindowTitle("Metrics")
+        self.resize(640, 480)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.refresh_button = QPushButton("Refresh")
+        self.open_button = QPushButton("Open Folder")
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.text)
+        layout.addWidget(self.refresh_button)
+        layout.addWidget(self.open_button)
+        self.setLayout(layout)
+
+        self.refresh_button.clicked.connect(self.refresh)
+        self.open_button.clicked.connect(self.open_folder)
+        self.refresh()
+
+    def refresh(self):
+        metrics = self.parent.metrics
+        # Write what is pending so the files match what is shown
+        metrics.flush()
+        self.text.setPlainText(metrics.summary())
+        self.open_button.setEnabled(metrics.path is not None)
+
+    def open_folder(self):
+        metrics = self.parent.metrics
+        if metrics.path is not None:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(metrics.path)))
+
+
+class StatsWindow(QWidget):
+    # Ranges offered by the statistics window, in days
+    RANGES = (("Today", 1), ("Last 7 days", 7), ("Last 30 days", 30), ("Last 365 days", 365))
+
+    def __init__(self, stats):
+        super().__init__()
+        self.stats = stats
+
+        self.setWindowTitle("Statistics")
+        self.resize(480, 480)
+
+        self.range_input = QComboBox()
+        for label, days in self.RANGES:
+            self.range_input.addItem(label, days)
+        self.range_input.setCurrentIndex(2)
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.range_input)
+        layout.addWidget(self.text)
+        self.setLayout(layout)
+
+        self.range_input.currentIndexChanged.connect(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        start_day, end_day = self.stats.last_days(self.range_input.currentData())
+        totals = self.stats.totals(start_day, end_day)
+        lines = [
+            f"Work: {format_duration(totals['work'][0])} in {totals['work'][1]} periods",
+            f"Breaks: {format_duration(totals['break'][0])} in {totals['break'][1]} periods",
+            f"Paused: {format_duration(totals['paused'][0])} in {totals['paused'][1]} periods",
+            "",
+            f"{'Day':<12}{'Work':>8}{'Break':>8}{'Paused':>8}",
+        ]
+        for day, states in self.stats.daily(start_day, end_day).items():
+            durations = [format_duration(states.get(state, (0, 0))[0]) for state in STATES]
+            lines.append(f"{day:<12}" + "".join(f"{duration:>8}" for duration in durations))
+        self.text.setPlainText("\n".join(lines))
 
 
 class MainApp(QObject):
-    def __init__(self):
+    def __init__(self, profile_startup=False):
         super().__init__()
+        self.profile = StartupProfile(profile_startup)
+        self.profile.mark("imports")
+
         self.app = QApplication(sys.argv)
         self.app.setQuitOnLastWindowClosed(False)
+        self.app.aboutToQuit.connect(self.shutdown)
 
         self.sound_enabled = True
         self.animation_enabled = True
-        self.is_paused = False
 
-        # Initialize animation_window
+        # The animation window is created on first use, then kept hidden
+        # between animations
         self.animation_window = None
+        # Cue of the animation being started
+        self.animation_cue = None
+        # Small alert window of the "overlay" tier, created on first use too
+        self.corner_overlay = None
+        # Cheaper alert tier forced by a fallback, None while the configured
+        # one is in use
+        self.fallback_tier = None
+        # Alerts left before the configured tier is tried again
+        self.fallback_alerts = 0
+        # Animations in a row that dropped too many frames
+        self.bad_animations = 0
+        # Settings, statistics and metrics windows, one of each at most
+        self.windows = {}
+        # Whether the launch animation waits for its frames to be loaded
+        self.startup_pending = False
 
         # Set application and organization name for correct paths
         QCoreApplication.setOrganizationName("SECRET_GUEST")
@@ -233,12 +328,76 @@ class MainApp(QObject):
             "work_interval": 45 * 60,
             "break_intervals": [10 * 60, 20 * 60],
             "total_duration": 8 * 60 * 60,
+            # Decode animation frames on the fly, keeping only a few in memory
+            "streaming": True,
+            "ring_size": 8,
+            # Threads decoding and scaling frames, 0 uses every CPU up to 4
+            "decode_threads": 0,
+            # Size cap of the on-disk cache of pre-scaled frames
+            "frame_cache_mb": 4096,
+            # Start loading the next animation this many seconds before its
+            # cue, 0 loads it at the last moment
+            "prefetch_seconds": 60,
+            # Cap on the height of animation frames, 0 keeps screen size
+            "max_frame_height": 0,
+            # Step down quality when the animation falls behind
+            "adaptive_quality": True,
+            # Cover every screen, not only the primary one
+            "all_screens": True,
+            # How transitions are signalled: "animation" full screen,
+            # "overlay" a small loop in a corner, "notification" a tray message
+            "alert": "animation",
+            # Step down to a lighter alert when animation frames are late,
+            # and leave the full animation out below `low_memory_mb` of free
+            # memory
+            "alert_fallback": True,
+            "low_memory_mb": 512,
+            # Runtime metrics sink: "off", "jsonl" or "prometheus"
+            "metrics": "off",
+            # Launch animation: "async" loads it in the background and plays
+            # it when ready, "play" loads it right away, "skip" leaves it out
+            "startup_animation": "async",
         }
         self.settings = self.default_settings.copy()
         self.load_settings()
+        self.profile.mark("settings")
+
+        # notimectl.py and later launches talk to this instance. The socket is
+        # claimed before any statistics are recovered or recorded, a second
+        # instance must not touch them. Listening replaces a socket of the
+        # same name, so an instance that answers is looked for first: one
+        # started at the same time as this one.
+        self.control = ControlServer(self.handle_command)
+        if send({"command": "status"}) is not None:
+            print("Notime is already running, use notimectl.py to control it", file=sys.stderr)
+            sys.exit(0)
+        # Otherwise a socket still there was left by an instance that crashed
+        if not self.control.listen() and not self.control.listen(replace=True):
+            print(f"Cannot open the control socket: {self.control.error()}", file=sys.stderr)
+            sys.exit(1)
+        self.profile.mark("control server")
+
+        # Every timed event (cycle boundaries, prefetch, end of the day,
+        # metrics flush) is a deadline on this scheduler
+        self.scheduler = DeadlineScheduler()
+
+        # Pre-scaled frames are cached next to the configuration file
+        self.frame_cache = FrameCache(
+            os.path.join(os.path.dirname(self.config_path), "frame_cache"),
+            self.settings["frame_cache_mb"] * 1024 * 1024,
+        )
+
+        # Runtime metrics, written periodically when enabled
+        self.metrics = None
+        self.apply_metrics_settings()
+
+        # Work, break and pause history
+        self.stats = StatsStore(os.path.join(os.path.dirname(self.config_path), "stats.sqlite"))
+        self.stats.recover()
 
         # Initialize system tray icon
         self.create_tray_icon()
+        self.profile.mark("tray icon")
 
         # Paths for animations and sounds
         self.counter_folder = os.path.join(self.image_folder, "counter")
@@ -246,13 +405,53 @@ class MainApp(QObject):
         self.counter_sound = os.path.join(self.sound_folder, "counter.wav")
         self.over_sound = os.path.join(self.sound_folder, "over.wav")
 
-        # Start timers
-        self.start_time = datetime.datetime.now()
-        self.elapsed_time = datetime.timedelta(0)
-        self.init_timers()
+        # One player per sound cue, created when first needed and reused
+        self.sounds = SoundPool()
 
-        # Start the initial 'counter' animation
+        # Animation and sound of each cue of the cycle
+        self.cues = {
+            "over": (self.over_folder, self.over_sound),
+            "counter": (self.counter_folder, self.counter_sound),
+        }
+
+        # The work and break cycle runs on the scheduler's deadlines, this
+        # app only shows its cues
+        self.cycle = CycleEngine(self.scheduler, self.on_cue, self.prefetch_next_animation, self.end_of_day)
+        self.configure_cycle()
+        self.cycle.start()
+        self.stats.record("start")
+        self.checkpoint_stats()
+
+        # Sounds and the initial 'counter' animation wait for the event loop,
+        # so the tray icon is up first
+        QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        self.profile.mark("event loop")
+        mode = self.settings["startup_animation"]
+        if mode == "skip" or not self.animation_enabled:
+            self.profile.report()
+            return
+
+        self.preload_sounds()
+        self.profile.mark("sounds")
+        if mode == "async" and self.alert_tier() == "animation":
+            # Played by on_prefetch_ready once its first frames are loaded
+            self.startup_pending = True
+            self.get_animation_window().prefetch(self.counter_folder)
+            self.profile.mark("animation loading")
+        else:
+            self.show_counter_animation()
+            self.profile.mark("animation playing")
+            self.profile.report()
+
+    def on_prefetch_ready(self):
+        if not self.startup_pending or self.cycle.paused:
+            return
+        self.startup_pending = False
         self.show_counter_animation()
+        self.profile.mark("animation playing")
+        self.profile.report()
 
     def create_tray_icon(self):
         if os.path.exists(self.icon_path):
@@ -279,6 +478,16 @@ class MainApp(QObject):
         self.sound_action.triggered.connect(self.toggle_sound)
         self.menu.addAction(self.sound_action)
 
+        # Statistics action
+        self.stats_action = QAction("Statistics")
+        self.stats_action.triggered.connect(self.show_stats)
+        self.menu.addAction(self.stats_action)
+
+        # Metrics action
+        self.metrics_action = QAction("Metrics")
+        self.metrics_action.triggered.connect(self.show_metrics)
+        self.menu.addAction(self.metrics_action)
+
         # Settings action
         self.settings_action = QAction("Settings")
         self.settings_action.triggered.connect(self.show_settings)
@@ -293,9 +502,14 @@ class MainApp(QObject):
         self.tray_icon.setContextMenu(self.menu)
         self.tray_icon.show()
 
-        # Timer to update the elapsed time display
+        # The elapsed time display only ticks while the menu is open
         self.elapsed_time_timer = QTimer()
         self.elapsed_time_timer.timeout.connect(self.update_elapsed_time)
+        self.menu.aboutToShow.connect(self.on_menu_shown)
+        self.menu.aboutToHide.connect(self.elapsed_time_timer.stop)
+
+    def on_menu_shown(self):
+        self.update_elapsed_time()
         self.elapsed_time_timer.start(1000)
 
     def toggle_sound(self):
@@ -306,137 +520,348 @@ class MainApp(QObject):
         # Exit the application
         QApplication.quit()
 
+    def shutdown(self):
+        # Stop the decoder, delete the windows and release the pooled players
+        # before Qt goes away
+        if self.animation_window is not None:
+            self.animation_window.dispose()
+            self.animation_window = None
+        if self.corner_overlay is not None:
+            self.corner_overlay.dispose()
+            self.corner_overlay = None
+        # Background cache fills write the pack from their own threads
+        self.frame_cache.close()
+        for window in self.windows.values():
+            window.close()
+            window.deleteLater()
+        self.windows = {}
+        self.control.close()
+        self.sounds.release()
+        self.metrics.flush()
+        self.stats.record("stop")
+        self.stats.close()
+
     def toggle_pause(self):
-        if not self.is_paused:
-            # Pause the timers
-            self.timer.stop()
-            self.elapsed_time_timer.stop()
-            if self.animation_window:
-                self.animation_window.close()
-                self.animation_window = None
+        if not self.cycle.paused:
+            # Pause the timers, elapsed time stops counting
+            self.cycle.pause()
+            if self.animation_window is not None:
+                self.animation_window.stop()
+                self.animation_window.cancel_prefetch()
+            if self.corner_overlay is not None:
+                self.corner_overlay.stop()
             self.pause_action.setText("Start")
-            self.is_paused = True
-            # Save elapsed time up to now
-            self.elapsed_time += datetime.datetime.now() - self.start_time
+            self.startup_pending = False
+            self.stats.record("pause")
         else:
             # Reload settings in case they were changed
             self.load_settings()
 
             # Restart the program
-            self.start_time = datetime.datetime.now()
-            self.init_timers()
-            self.elapsed_time_timer.start(1000)
+            self.configure_cycle()
+            self.cycle.resume()
+            self.stats.record("resume")
             self.pause_action.setText("Pause")
-            self.is_paused = False
             self.show_counter_animation()
 
+    def handle_command(self, request):
+        # Requests from notimectl.py, see control.py
+        command = request.get("command")
+        if command == "ping":
+            return {"ok": True}
+        if command == "status":
+            due = self.scheduler.deadline("cycle")
+            return {
+                "ok": True,
+                "paused": self.cycle.paused,
+                "elapsed": self.cycle.elapsed(),
+                "remaining": max(0, self.cycle.total_duration - self.cycle.elapsed()),
+                "next_cue": self.cycle.next_cue,
+                "next_cue_in": None if due is None else max(0, due - self.scheduler.now()),
+                "work_interval": self.settings["work_interval"],
+                "break_intervals": self.settings["break_intervals"],
+                "total_duration": self.settings["total_duration"],
+            }
+        if command in ("pause", "resume"):
+            if self.cycle.paused == (command == "resume"):
+                self.toggle_pause()
+            return {"ok": True, "paused": self.cycle.paused}
+        if command == "restart":
+            self.restart_program()
+            return {"ok": True}
+        if command == "set":
+            return self.set_intervals(request)
+        if command == "quit":
+            # Reply first, then leave
+            QTimer.singleShot(0, self.exit_app)
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown command {command!r}"}
+
+    def set_intervals(self, request):
+        # Same as saving the settings window with new durations, in seconds
+        changes = {
+            key: request[key]
+            for key in ("work_interval", "break_intervals", "total_duration")
+            if key in request
+        }
+        breaks = changes.get("break_intervals", [1, 1])
+        if not changes or not isinstance(breaks, list) or len(breaks) != 2:
+            return {"ok": False, "error": "nothing to set, or not two break intervals"}
+        durations = [changes.get("work_interval", 1), changes.get("total_duration", 1)] + breaks
+        if not all(isinstance(value, int) and value > 0 for value in durations):
+            return {"ok": False, "error": "durations must be whole positive seconds"}
+        self.settings.update(changes)
+        self.save_settings()
+        self.restart_program()
+        return {"ok": True}
+
+    def show_window(self, name, window):
+        # Opening a window again replaces the previous one, which is deleted
+        # right away instead of lingering hidden
+        previous = self.windows.pop(name, None)
+        if previous is not None:
+            previous.close()
+            previous.deleteLater()
+        self.windows[name] = window
+        window.show()
+
     def show_settings(self):
         # Display the settings window
-        self.settings_window = SettingsWindow(self.settings, self)
-        self.settings_window.show()
+        self.show_window("settings", SettingsWindow(self.settings, self))
 
-    def restart_program(self):
-        # Restart the program with current settings
-        self.timer.stop()
-        self.start_time = datetime.datetime.now()
-        self.elapsed_time = datetime.timedelta(0)
-        self.init_timers()
-        if self.is_paused:
-            self.elapsed_time_timer.start(1000)
-            self.pause_action.setText("Pause")
-            self.is_paused = False
-        self.show_counter_animation()
+    def show_stats(self):
+        # Display the work and break history
+        self.show_window("stats", StatsWindow(self.stats))
 
-    def init_timers(self):
-        # Initialize the main timer
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.run_cycle)
-        self.cycle_step = 0
-        self.interval_work = self.settings["work_interval"]
-        self.intervals_pause = self.settings["break_intervals"]
+    def show_metrics(self):
+        # Display what was recorded so far
+        self.show_window("metrics", MetricsWindow(self))
 
-        self.timer.start(self.interval_work * 1000)
-
-    def run_cycle(self):
-        if self.is_paused:
+    def apply_metrics_settings(self):
+        # Switch sinks when the setting changed
+        sink = self.settings["metrics"]
+        if self.metrics is not None and self.metrics_sink == sink:
             return
-
-        if self.cycle_step % 2 == 0:
-            # End of work period, show 'over' animation
-            if self.animation_enabled:
-                self.show_animation(self.over_folder, self.over_sound)
-            elif self.sound_enabled:
-                self.play_sound(self.over_sound)
-
-            # Set up the break interval
-            current_interval = self.intervals_pause[(self.cycle_step // 2) % 2]
-            self.timer.start(current_interval * 1000)
+        if self.metrics is not None:
+            self.metrics.flush()
+        self.metrics_sink = sink
+        self.metrics = create_metrics(sink, os.path.join(os.path.dirname(self.config_path), "metrics"))
+        self.flush_metrics()
+
+    def flush_metrics(self, deadline=None):
+        self.metrics.flush()
+        # Only wake up for metrics when they are recorded
+        if self.metrics.enabled:
+            if deadline is None:
+                deadline = self.scheduler.now()
+            self.scheduler.schedule("metrics", deadline + METRICS_FLUSH_SECONDS, self.flush_metrics)
         else:
-            # End of break, show 'counter' animation
-            if self.animation_enabled:
-                self.show_animation(self.counter_folder, self.counter_sound)
-            elif self.sound_enabled:
-                self.play_sound(self.counter_sound)
+            self.scheduler.cancel("metrics")
+
+    def checkpoint_stats(self, deadline=None):
+        # A crash loses at most the time since the last checkpoint
+        self.stats.checkpoint()
+        if deadline is None:
+            deadline = self.scheduler.now()
+        self.scheduler.schedule("stats", deadline + STATS_CHECKPOINT_SECONDS, self.checkpoint_stats)
+
+    def record_animation(self, stats):
+        self.metrics.inc("animations")
+        self.metrics.observe("load_ms", stats["load_ms"])
+        if stats["audio_start_ms"] is not None:
+            self.metrics.observe("audio_start_ms", stats["audio_start_ms"])
+        self.metrics.event("animation", folder=os.path.basename(self.animation_window.image_folder), **stats)
+        if stats["dropped"] <= MAX_DROPPED_SHARE * stats["frames"]:
+            # Back to normal, whatever happened before
+            self.bad_animations = 0
+        elif not stats["cache_fill"]:
+            # A run filling the cache is slower than the ones after it
+            self.bad_animations += 1
+            if self.settings["alert_fallback"] and self.bad_animations >= FALLBACK_BAD_RUNS:
+                self.fall_back(f"{stats['dropped']} of {stats['frames']} animation frames dropped")
+
+    def on_overlay_finished(self, stats):
+        if self.settings["alert_fallback"] and stats["late"] > MAX_LATE_SHARE * stats["frames"]:
+            self.fall_back(f"{stats['late']} of {stats['frames']} overlay frames late")
+
+    def configured_tier(self):
+        # Alert tier from the settings, or the cheaper one a fallback chose
+        tier = self.settings["alert"] if self.settings["alert"] in ALERT_TIERS else "animation"
+        if self.fallback_tier is not None and ALERT_TIERS.index(self.fallback_tier) < ALERT_TIERS.index(tier):
+            return self.fallback_tier
+        return tier
+
+    def alert_tier(self):
+        # Tier of the next alert. Low memory only skips the full animation
+        # for this alert, there may be enough again by the next one.
+        tier = self.configured_tier()
+        if tier == "animation" and self.settings["alert_fallback"]:
+            available = available_memory_mb()
+            if available is not None and available < self.settings["low_memory_mb"]:
+                return "overlay"
+        return tier
+
+    def count_fallback_alert(self):
+        # A fallback only lasts a few alerts, the next one after them tries
+        # the configured tier again. A single bad animation then falls back
+        # right away, a good one resets the count.
+        if self.fallback_tier is None:
+            return
+        self.fallback_alerts -= 1
+        if self.fallback_alerts <= 0:
+            self.fallback_tier = None
+            self.metrics.event("alert_fallback", tier=self.configured_tier(), reason="retry")
+
+    def fall_back(self, reason):
+        # Lighter alerts for the next few alerts, or until the day is
+        # restarted or the settings saved
+        tier = self.configured_tier()
+        if tier == ALERT_TIERS[0]:
+            return
+        self.fallback_tier = cheaper_tier(tier)
+        self.fallback_alerts = FALLBACK_ALERTS
+        self.metrics.inc("alert_fallbacks")
+        self.metrics.event("alert_fallback", tier=self.fallback_tier, reason=reason)
+        print(f"Switching to {self.fallback_tier} alerts: {reason}", file=sys.stderr)
 
-            self.timer.start(self.interval_work * 1000)
+    def restart_program(self):
+        # Restart the program with current settings
+        self.apply_metrics_settings()
+        # The configured alert gets another chance
+        self.fallback_tier = None
+        self.bad_animations = 0
+        self.configure_cycle()
+        self.cycle.restart()
+        self.stats.record("restart")
+        self.pause_action.setText("Pause")
+        self.show_counter_animation()
 
-        self.cycle_step += 1
+    def configure_cycle(self):
+        # Nothing to prefetch without animations
+        prefetch_seconds = self.settings["prefetch_seconds"] if self.animation_enabled else 0
+        self.cycle.configure(
+            self.settings["work_interval"],
+            self.settings["break_intervals"],
+            self.settings["total_duration"],
+            prefetch_seconds,
+        )
+
+    def prefetch_next_animation(self, cue=None):
+        if self.cycle.paused:
+            return
+        # Sounds are not loaded yet when the launch animation was skipped
+        self.preload_sounds()
+        folder, _ = self.cues[cue or self.cycle.next_cue]
+        tier = self.alert_tier()
+        if tier == "animation":
+            self.get_animation_window().prefetch(folder)
+        elif tier == "overlay":
+            self.get_corner_overlay().load(folder)
+
+    def end_of_day(self):
+        # The total duration is reached
+        self.exit_app()
+
+    def on_cue(self, step, cue, late):
+        if self.metrics.enabled:
+            # How late the boundary ran compared to when it was due
+            drift_ms = late * 1000
+            self.metrics.observe("cycle_drift_ms", abs(drift_ms))
+            self.metrics.event("cycle", step=step, drift_ms=round(drift_ms, 1))
+
+        # 'over' ends a work period, 'counter' ends a break
+        self.stats.record("break" if cue == "over" else "work")
+        self.show_cue(cue)
 
     def show_counter_animation(self):
         # Display the initial 'counter' animation
-        if self.animation_enabled:
-            self.show_animation(self.counter_folder, self.counter_sound)
-        elif self.sound_enabled:
-            self.play_sound(self.counter_sound)
+        self.show_cue("counter")
 
-    def show_animation(self, folder, sound_file):
-        # Before creating a new animation, check if the previous one exists
-        if self.animation_window is not None:
-            try:
-                self.animation_window.close()
-            except RuntimeError:
-                pass
-            self.animation_window = None
+    def show_cue(self, cue):
+        folder, sound_file = self.cues[cue]
+        if not self.animation_enabled:
+            if self.sound_enabled:
+                self.play_sound(sound_file)
+            return
 
-        # Create a new animation window
-        self.animation_window = FullScreenAnimation(
-            folder,
-            sound_file if self.sound_enabled else None,
-            fps=30  # Ensure the FPS matches your animation
-        )
+        tier = self.alert_tier()
+        if tier != self.configured_tier():
+            self.metrics.event("alert_fallback", tier=tier, reason="low memory")
+        self.count_fallback_alert()
+        if tier == "animation" and self.show_animation(folder, sound_file):
+            self.animation_cue = cue
+            return
+        self.show_lighter_alert(cue, tier)
 
-        # Connect the destroyed signal to update the animation_window reference
-        self.animation_window.destroyed.connect(self.on_animation_closed)
+    def on_animation_start_failed(self):
+        # The animation never got its first frames, the cue still goes out
+        self.show_lighter_alert(self.animation_cue, "overlay")
 
-    def on_animation_closed(self):
-        # Update the reference when the animation window is closed
-        self.animation_window = None
+    def show_lighter_alert(self, cue, tier):
+        folder, sound_file = self.cues[cue]
+        # Lighter alerts play the sound on its own, so does an animation
+        # without frames before falling back to them
+        if self.animation_window is not None:
+            self.animation_window.stop()
+        if self.corner_overlay is not None:
+            self.corner_overlay.stop()
+        if self.sound_enabled:
+            self.play_sound(sound_file)
+        if tier != "notification" and self.get_corner_overlay().play(folder):
+            return
+        self.tray_icon.showMessage("Notime", MESSAGES[cue], QSystemTrayIcon.Information, NOTIFICATION_MS)
+
+    def get_corner_overlay(self):
+        if self.corner_overlay is None:
+            self.corner_overlay = CornerOverlay(fps=30)
+            self.corner_overlay.finished.connect(self.on_overlay_finished)
+        return self.corner_overlay
+
+    def get_animation_window(self):
+        if self.animation_window is None:
+            self.animation_window = FullScreenAnimation(
+                fps=30,  # Ensure the FPS matches your animation
+                streaming=self.settings["streaming"],
+                ring_size=self.settings["ring_size"],
+                cache=self.frame_cache,
+                sounds=self.sounds,
+                decode_threads=self.settings["decode_threads"],
+            )
+            self.animation_window.finished.connect(self.record_animation)
+            self.animation_window.prefetch_ready.connect(self.on_prefetch_ready)
+            self.animation_window.start_failed.connect(self.on_animation_start_failed)
+        # Quality and metrics settings can change while the window is kept around
+        self.animation_window.max_height = self.settings["max_frame_height"]
+        self.animation_window.adaptive_quality = self.settings["adaptive_quality"]
+        self.animation_window.metrics = self.metrics
+        self.animation_window.all_screens = self.settings["all_screens"]
+        return self.animation_window
+
+    def show_animation(self, folder, sound_file):
+        # Any animation still running is interrupted by the new one
+        if self.corner_overlay is not None:
+            self.corner_overlay.stop()
+        # False when the animation has no frames to show
+        return self.get_animation_window().play(folder, sound_file if self.sound_enabled else None)
 
     def play_sound(self, sound_file):
         # Play a sound without animation
-        audio_output = QAudioOutput()
-        player = QMediaPlayer()
-        player.setAudioOutput(audio_output)
-        url = QUrl.fromLocalFile(sound_file)
-        player.setSource(url)
-        player.play()
+        self.sounds.play(sound_file)
 
-    def update_elapsed_time(self):
-        if self.is_paused:
-            return
+    def preload_sounds(self):
+        # A full-screen animation follows its sound through a media player,
+        # lighter alerts play it as a sound effect
+        follow = self.animation_enabled and self.alert_tier() == "animation"
+        self.sounds.preload(self.counter_sound, self.over_sound, follow=follow)
 
+    def update_elapsed_time(self):
         # Update the elapsed time display
-        total_elapsed = self.elapsed_time + (datetime.datetime.now() - self.start_time)
-        total_seconds = int(total_elapsed.total_seconds())
+        total_seconds = int(self.cycle.elapsed())
         hours, remainder = divmod(total_seconds, 3600)
         minutes, seconds = divmod(remainder, 60)
         elapsed_str = f"Elapsed Time: {hours:02}:{minutes:02}:{seconds:02}"
         self.elapsed_time_action.setText(elapsed_str)
 
-        # Check if the total duration is reached
-        if total_seconds >= self.settings["total_duration"]:
-            self.exit_app()
-
     def load_settings(self):
         # Load settings from the configuration file
         config_dir = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
@@ -465,5 +890,20 @@ class MainApp(QObject):
 
 
 if __name__ == "__main__":
-    app = MainApp()
+    parser = argparse.ArgumentParser(description="Work and break cycle reminder.")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print where launch time goes",
+    )
+    # Anything else is left to Qt
+    args, _ = parser.parse_known_args()
+
+    # A second launch leaves the running instance alone, without starting
+    # a GUI of its own
+    if send({"command": "ping"}) is not None:
+        print("Notime is already running, use notimectl.py to control it", file=sys.stderr)
+        sys.exit(0)
+
+    app = MainApp(profile_startup=args.profile_startup)
     app.run()
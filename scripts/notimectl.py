@@ -0,0 +1,70 @@
+import sys
+import json
+import argparse
+
+from control import send
+
+
+def format_seconds(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def print_status(reply):
+    print(f"State:     {'paused' if reply['paused'] else 'running'}")
+    print(f"Elapsed:   {format_seconds(reply['elapsed'])}")
+    print(f"Remaining: {format_seconds(reply['remaining'])}")
+    if reply["next_cue_in"] is not None:
+        label = "break" if reply["next_cue"] == "over" else "work"
+        print(f"Next:      {label} in {format_seconds(reply['next_cue_in'])}")
+    print(
+        f"Intervals: work {reply['work_interval'] // 60} min, "
+        f"breaks {', '.join(str(seconds // 60) for seconds in reply['break_intervals'])} min, "
+        f"total {reply['total_duration'] / 3600:g} h"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control the running Notime app.")
+    parser.add_argument("--json", action="store_true", help="print the raw reply")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="show the state of the cycle")
+    commands.add_parser("pause", help="pause the cycle")
+    commands.add_parser("resume", help="resume the cycle")
+    commands.add_parser("restart", help="start the day over")
+    commands.add_parser("quit", help="exit the app")
+    intervals = commands.add_parser("set-interval", help="change intervals and restart the day")
+    intervals.add_argument("--work", type=int, help="work interval in minutes")
+    intervals.add_argument("--breaks", help="comma separated break intervals in minutes, e.g. 10,20")
+    intervals.add_argument("--total", type=float, help="total duration in hours")
+    args = parser.parse_args()
+
+    request = {"command": args.command}
+    if args.command == "set-interval":
+        request["command"] = "set"
+        if args.work is not None:
+            request["work_interval"] = args.work * 60
+        if args.breaks is not None:
+            try:
+                request["break_intervals"] = [int(minutes) * 60 for minutes in args.breaks.split(",")]
+            except ValueError:
+                parser.error("--breaks takes whole minutes, e.g. 10,20")
+        if args.total is not None:
+            request["total_duration"] = int(args.total * 3600)
+
+    reply = send(request)
+    if reply is None:
+        print("Notime is not running", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(reply, indent=2))
+    elif not reply.get("ok"):
+        print(reply.get("error", "failed"), file=sys.stderr)
+    elif args.command == "status":
+        print_status(reply)
+    return 0 if reply.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+
+from PySide6.QtGui import QImage
+from PySide6.QtCore import QRect, QBuffer, QByteArray, QIODevice
+
+from framepack import FRAME_FORMAT, MANIFEST_NAME, MANIFEST_VERSION, list_frames, optimized_path
+
+# WebP quality of the cropped frames, 100 is lossless
+DEFAULT_QUALITY = 100
+# Transparent pixels kept around the visible ones
+MARGIN = 4
+
+
+def visible_rect(image):
+    # Bounding box of the pixels that are not fully transparent. Transparent
+    # premultiplied pixels are all zero bytes, so whole rows are compared at
+    # once and each row is only stripped from both ends.
+    width = image.width()
+    bytes_per_line = image.bytesPerLine()
+    data = image.constBits().tobytes()
+    empty_row = bytes(width * 4)
+
+    rows = [
+        y for y in range(image.height())
+        if data[y * bytes_per_line:y * bytes_per_line + width * 4] != empty_row
+    ]
+    if not rows:
+        return QRect()
+    left = width
+    right = 0
+    for y in rows:
+        row = data[y * bytes_per_line:y * bytes_per_line + width * 4]
+        left = min(left, (len(row) - len(row.lstrip(b"\0"))) // 4)
+        right = max(right, (len(row.rstrip(b"\0")) + 3) // 4)
+    return QRect(left, rows[0], right - left, rows[-1] - rows[0] + 1)
+
+
+def encode_webp(image, quality):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    if not image.save(buffer, "webp", quality):
+        return None
+    return data.data()
+
+
+def check_frame(path, rect, frame, lossless, uncropped=False):
+    # The stored file must decode to the part of `frame` it stands for, pixel
+    # for pixel unless it was saved lossy
+    image = QImage(path)
+    if image.isNull():
+        raise ValueError(f"{path} cannot be read back")
+    if uncropped:
+        image = image.copy(rect)
+    if image.size() != rect.size():
+        raise ValueError(f"{path} reads back at the wrong size")
+    if lossless and image.convertToFormat(FRAME_FORMAT) != frame.copy(rect):
+        raise ValueError(f"{path} does not read back as the original frame")
+
+
+def optimize_folder(image_folder, output_folder=None, quality=DEFAULT_QUALITY):
+    # Offline step: crop every frame to its visible pixels and store runs of
+    # identical frames once, with a manifest the players follow
+    output_folder = output_folder or optimized_path(image_folder)
+    temp_folder = output_folder + ".tmp"
+    shutil.rmtree(temp_folder, ignore_errors=True)
+    os.makedirs(temp_folder)
+
+    entries = []
+    previous_data = None
+    canvas = None
+    try:
+        for img_path in list_frames(image_folder):
+            image = QImage(str(img_path))
+            if image.isNull():
+                raise ValueError(f"{img_path} cannot be decoded")
+            if canvas is None:
+                canvas = image.size()
+            elif image.size() != canvas:
+                raise ValueError(f"{img_path} is not {canvas.width()}x{canvas.height()}")
+
+            premultiplied = image.convertToFormat(FRAME_FORMAT)
+            data = premultiplied.constBits().tobytes()
+            if data == previous_data:
+                entries[-1]["hold"] += 1
+                continue
+            previous_data = data
+
+            rect = visible_rect(premultiplied)
+            if rect.isEmpty():
+                # A fully transparent frame has no file, the canvas is cleared
+                entries.append({"file": None, "hold": 1})
+                continue
+            # A transparent margin keeps the edges right once the crop is scaled
+            rect = rect.adjusted(-MARGIN, -MARGIN, MARGIN, MARGIN).intersected(image.rect())
+            entry = {
+                "file": img_path.name,
+                "x": rect.x(),
+                "y": rect.y(),
+                "width": rect.width(),
+                "height": rect.height(),
+                "hold": 1,
+            }
+            data = encode_webp(image.copy(rect), quality)
+            if data is None:
+                raise OSError(f"cannot write {img_path.name}")
+            stored_path = os.path.join(temp_folder, img_path.name)
+            if quality == 100 and os.path.getsize(img_path) <= len(data):
+                # A lossy frame only grows once stored without loss, the
+                # original file is kept whole instead and cropped when read
+                shutil.copyfile(img_path, stored_path)
+                entry["uncropped"] = True
+            else:
+                with open(stored_path, "wb") as f:
+                    f.write(data)
+            check_frame(stored_path, rect, premultiplied, quality == 100, entry.get("uncropped", False))
+            entries.append(entry)
+        if canvas is None:
+            raise ValueError(f"{image_folder} has no frames")
+
+        with open(os.path.join(temp_folder, MANIFEST_NAME), "w") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "width": canvas.width(),
+                "height": canvas.height(),
+                "frames": entries,
+            }, f, indent=1)
+    except BaseException:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        raise
+
+    shutil.rmtree(output_folder, ignore_errors=True)
+    os.replace(temp_folder, output_folder)
+    return output_folder, entries, canvas
+
+
+def folder_bytes(folder):
+    return sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop animation frames to their visible pixels and merge repeated frames.")
+    parser.add_argument("folder", help="folder of numbered .webp or .png frames")
+    parser.add_argument("-o", "--output", help="output folder (default: <folder>.opt)")
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=DEFAULT_QUALITY,
+        help="WebP quality of the cropped frames, 100 for lossless, lower values make smaller lossy crops (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    try:
+        output_folder, entries, canvas = optimize_folder(args.folder, args.output, args.quality)
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    frames = sum(entry["hold"] for entry in entries)
+    # Uncropped files are decoded whole, empty frames not at all
+    decoded = sum(
+        canvas.width() * canvas.height() if entry.get("uncropped") else entry.get("width", 0) * entry.get("height", 0)
+        for entry in entries
+    )
+    print(
+        f"{output_folder}: {len(entries)} of {frames} frames stored, "
+        f"{decoded / (len(entries) * canvas.width() * canvas.height()):.0%} of the canvas decoded, "
+        f"{folder_bytes(args.folder) / (1024 * 1024):.1f} MB -> {folder_bytes(output_folder) / (1024 * 1024):.1f} MB"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
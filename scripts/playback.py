@@ -0,0 +1,783 @@
+import os
+import sys
+import math
+import time
+import threading
+import statistics
+
+from PySide6.QtWidgets import QWidget, QVBoxLayout
+from PySide6.QtGui import QGuiApplication, QPixmap, QPainter, QRegion
+from PySide6.QtCore import Qt, QPoint, QRect, QRectF, QSize, QObject, Signal, QTimer, QElapsedTimer
+
+from audio import SoundPool
+from delta import draw_frame
+from frames import (
+    DecodedStore,
+    FolderSource,
+    FrameStream,
+    PrefetchedSource,
+    StageTimings,
+    frame_files,
+    open_source,
+)
+from metrics import NullMetrics
+
+
+def summarize(samples):
+    # Mean, 95th percentile and worst absolute value of a list of ms samples
+    if not samples:
+        return None
+    magnitudes = sorted(abs(sample) for sample in samples)
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 2),
+        "p95_ms": round(magnitudes[int(0.95 * (len(magnitudes) - 1))], 2),
+        "max_ms": round(magnitudes[-1], 2),
+    }
+
+
+class FreeClock:
+    # Monotonic wall clock, used when there is no sound to follow
+    def __init__(self):
+        self.timer = QElapsedTimer()
+        self.start_latency = None
+
+    def start(self):
+        self.timer.start()
+
+    def elapsed(self):
+        return self.timer.elapsed()
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return None
+
+
+class AudioClock(QObject):
+    # Follows the position of the media player so frames stay in sync with
+    # the sound. Position updates are coarse, in between them the position is
+    # extrapolated with a monotonic timer.
+
+    # How long the clock waits for the audio backend before running freely
+    START_TIMEOUT_MS = 300
+
+    def __init__(self, player):
+        super().__init__()
+        self.player = player
+        self.position = 0
+        self.last_elapsed = 0
+        self.synced = False
+        self.since_start = QElapsedTimer()
+        self.since_update = QElapsedTimer()
+        # Extrapolated minus reported position, sampled at each update
+        self.errors = []
+        # Time from start() until the sound actually played
+        self.start_latency = None
+        self.player.positionChanged.connect(self.on_position_changed)
+
+    def start(self):
+        self.since_start.start()
+        self.since_update.start()
+
+    def stop(self):
+        # The player is pooled and outlives this clock
+        self.player.positionChanged.disconnect(self.on_position_changed)
+
+    def on_position_changed(self, position):
+        # A pooled player may still report its previous run before restarting
+        if self.player.playbackState() != self.player.PlaybackState.PlayingState:
+            return
+        if self.synced:
+            self.errors.append(self.position + self.since_update.elapsed() - position)
+        else:
+            self.start_latency = self.since_start.elapsed()
+        self.synced = True
+        self.position = position
+        self.since_update.restart()
+
+    def elapsed(self):
+        if self.synced:
+            elapsed = self.position + self.since_update.elapsed()
+        elif self.since_start.elapsed() > self.START_TIMEOUT_MS:
+            # The sound did not start, do not hold the animation forever
+            elapsed = self.since_start.elapsed() - self.START_TIMEOUT_MS
+        else:
+            # Hold the first frame until the sound actually plays
+            elapsed = 0
+        # Never step back when an update lands behind the extrapolation
+        self.last_elapsed = max(self.last_elapsed, elapsed)
+        return self.last_elapsed
+
+    def stats(self):
+        return summarize(self.errors)
+
+
+def draw_frames(canvas, frames):
+    # Apply frames to the canvas, returns the canvas region that changed
+    # Frames before the last key frame would be painted over anyway
+    for index in range(len(frames) - 1, -1, -1):
+        if frames[index].key:
+            frames = frames[index:]
+            break
+
+    dirty = QRegion()
+    painter = QPainter(canvas)
+    for frame in frames:
+        draw_frame(painter, frame)
+        if frame.key:
+            dirty = QRegion(canvas.rect())
+        else:
+            for rect in frame.rects():
+                dirty += rect
+    painter.end()
+    return dirty
+
+
+class FrameView(QWidget):
+    # Shows a canvas of frames and only repaints the rectangles that changed,
+    # instead of the whole translucent window on every frame. A canvas
+    # smaller than the window is upscaled while painting. Views of screens
+    # with the same geometry share the same canvas.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.canvas = None
+        self.smooth = True
+
+    def set_canvas(self, canvas):
+        self.canvas = canvas
+        self.update()
+
+    def clear(self):
+        self.canvas = None
+        self.update()
+
+    def target_rect(self):
+        # The canvas is fitted to the window and centered
+        size = self.canvas.size().scaled(self.size(), Qt.KeepAspectRatio)
+        return QRect(
+            QPoint((self.width() - size.width()) // 2, (self.height() - size.height()) // 2),
+            size,
+        )
+
+    def map_to_view(self, rect, target):
+        # Window area covered by a canvas rectangle once scaled
+        scale_x = target.width() / self.canvas.width()
+        scale_y = target.height() / self.canvas.height()
+        return QRectF(
+            target.x() + rect.x() * scale_x,
+            target.y() + rect.y() * scale_y,
+            rect.width() * scale_x,
+            rect.height() * scale_y,
+        )
+
+    def update_canvas(self, dirty):
+        # Repaint the window area showing the changed canvas region
+        if dirty.isEmpty():
+            return
+        target = self.target_rect()
+        if target.size() == self.canvas.size():
+            self.update(dirty.translated(target.topLeft()))
+            return
+        # Filtering reaches one pixel around each scaled rectangle
+        region = QRegion()
+        for rect in dirty:
+            region += self.map_to_view(rect, target).toAlignedRect().adjusted(-1, -1, 1, 1)
+        self.update(region)
+
+    def paintEvent(self, event):
+        if self.canvas is None:
+            return
+        target = self.target_rect()
+        painter = QPainter(self)
+
+        if target.size() == self.canvas.size():
+            for rect in event.region():
+                rect = rect.intersected(target)
+                if not rect.isEmpty():
+                    painter.drawPixmap(rect, self.canvas, rect.translated(-target.topLeft()))
+            painter.end()
+            return
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.smooth)
+        scale_x = target.width() / self.canvas.width()
+        scale_y = target.height() / self.canvas.height()
+        for rect in event.region():
+            rect = rect.intersected(target)
+            if rect.isEmpty():
+                continue
+            # Take a slightly larger canvas area so filtering has neighbours,
+            # and clip to the rectangle being repainted
+            source = QRectF(
+                (rect.x() - target.x()) / scale_x,
+                (rect.y() - target.y()) / scale_y,
+                rect.width() / scale_x,
+                rect.height() / scale_y,
+            ).toAlignedRect().adjusted(-2, -2, 2, 2).intersected(self.canvas.rect())
+            painter.setClipRect(rect)
+            painter.drawPixmap(self.map_to_view(source, target), self.canvas, QRectF(source))
+        painter.end()
+
+
+class ScreenVariant:
+    # Frames scaled for one screen size and pixel ratio. They are drawn once
+    # on a canvas shared by the views of every screen with that geometry, so
+    # memory and decoding grow with distinct resolutions, not with screens.
+
+    def __init__(self, size, dpr):
+        self.size = size
+        self.dpr = dpr
+        self.views = []
+        self.canvas = None
+        self.stream = None
+        self.frames = []
+        self.shown_index = -1
+
+    def reset(self, frame_size):
+        self.canvas = QPixmap(frame_size)
+        self.canvas.fill(Qt.transparent)
+        for view in self.views:
+            view.set_canvas(self.canvas)
+
+    def take(self, frame_index):
+        # Frames due up to `frame_index` that were not shown yet
+        if self.stream is not None:
+            frames = self.stream.take(frame_index)
+            ready_index = self.stream.taken_index
+        else:
+            frames = self.frames[self.shown_index + 1:frame_index + 1]
+            ready_index = frame_index
+        return frames, ready_index
+
+    def show(self, frames):
+        dirty = draw_frames(self.canvas, frames)
+        for view in self.views:
+            view.update_canvas(dirty)
+
+    def pixmaps(self):
+        pixmaps = [self.canvas] if self.canvas is not None else []
+        for frame in self.frames:
+            pixmaps += [image for _, _, image in frame.patches]
+        return pixmaps
+
+    def release(self):
+        # Stop the decoder thread, nothing more will be displayed
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream = None
+        self.frames = []
+        self.canvas = None
+        for view in self.views:
+            view.clear()
+
+
+class OverlayWindow(QWidget):
+    # Frameless translucent window covering one screen
+
+    def __init__(self):
+        super().__init__()
+
+        # Window configuration
+        self.setWindowFlags(Qt.WindowStaysOnTopHint | Qt.FramelessWindowHint)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+
+        # Widget painting the frames
+        self.view = FrameView(self)
+
+        # Layout setup
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.view)
+
+    def show_on(self, screen):
+        if screen is not self.screen():
+            self.setScreen(screen)
+            self.setGeometry(screen.geometry())
+        self.showFullScreen()
+
+
+class FullScreenAnimation(OverlayWindow):
+    # Long-lived overlay window, shown for each animation and hidden in
+    # between so transitions do not rebuild a top-level translucent window.
+    # With `all_screens`, more overlays cover the other screens, fed from one
+    # decoding of the animation.
+
+    # Emitted when the animation ends, with its frame pacing statistics
+    finished = Signal(dict)
+    # Emitted once a prefetch has loaded its frames, from a loading thread
+    prefetch_ready = Signal()
+    # Emitted from a decoding thread whenever a frame is ready to be taken
+    frame_loaded = Signal()
+    # Emitted when a streamed animation gave up waiting for its first
+    # frames, nothing was shown
+    start_failed = Signal()
+
+    # Adaptive quality looks at drops over this many frames...
+    ADAPT_WINDOW = 30
+    # ...and steps down when more than this many were dropped
+    ADAPT_MAX_DROPS = 3
+    # How long a stream may take to load its first frame
+    FIRST_FRAME_TIMEOUT_MS = 3000
+
+    def __init__(
+        self,
+        fps=30,
+        streaming=False,
+        ring_size=8,
+        cache=None,
+        sounds=None,
+        decode_threads=0,
+        max_height=0,
+        adaptive_quality=True,
+        metrics=None,
+        all_screens=False,
+    ):
+        super().__init__()
+
+        self.fps = fps
+        self.streaming = streaming
+        self.ring_size = ring_size
+        self.cache = cache
+        self.sounds = sounds if sounds is not None else SoundPool()
+        # 0 sizes the decoding thread pool to the number of CPUs, up to 4
+        self.decode_threads = decode_threads or None
+        # Frames are kept at most this high and upscaled when painted, 0 keeps
+        # them at screen size
+        self.max_height = max_height
+        # Trade quality for speed when frame deadlines are missed
+        self.adaptive_quality = adaptive_quality
+        self.metrics = metrics if metrics is not None else NullMetrics()
+        # Cover every screen instead of just the one of this window
+        self.all_screens = all_screens
+        self.frame_duration = 1000 / self.fps  # Duration of each frame in milliseconds
+
+        self.image_folder = None
+        # Overlays of the other screens, kept between animations like this one
+        self.overlays = []
+        # Screen of this window and of each overlay
+        self.screens = []
+        # (width, height, dpr) -> ScreenVariant of the current animation
+        self.variants = {}
+        self.total_frames = 0
+        self.shown_index = -1
+        self.player = None
+        self.clock = None
+        # Whether background cache fills are held back for this animation
+        self.cache_paused = False
+        # Upcoming animation being loaded in the background, by variant
+        self.prefetched = {}
+        self.prefetch_pending = 0
+        self.prefetch_lock = threading.Lock()
+        # Where loading time goes, per stage, for the current animation
+        self.load_timings = StageTimings(self.metrics)
+
+        # Frame timer, only woken up at the next frame deadline
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.update_image)
+        # Whether the frame timer waits on the decoder, which wakes it up
+        # through `frame_loaded` rather than being polled
+        self.waiting_for_frames = False
+        self.frame_loaded.connect(self.on_frame_loaded)
+        # A streamed animation starts, windows and sound included, once
+        # every screen has its first frame
+        self.starting = False
+        self.sound_file = None
+        self.start_timer = QTimer(self)
+        self.start_timer.setSingleShot(True)
+        self.start_timer.timeout.connect(self.on_start_timeout)
+
+    def play(self, image_folder, sound_file=None):
+        # Interrupt whatever is playing, the windows are reused as they are
+        self.stop()
+        if self.cache is not None:
+            self.cache.pause()
+            self.cache_paused = True
+
+        self.image_folder = image_folder
+        self.shown_index = -1
+        self.dropped_frames = 0
+        # Whether frames are decoded for cache entries still missing
+        self.cache_fill = False
+        # How late each frame was shown, relative to the animation clock
+        self.frame_lags = []
+        self.last_shown_at = None
+
+        # Every animation starts at full quality
+        self.quality_level = 0
+        self.frame_step = 1
+        self.skipped_frames = 0
+        self.window_frames = 0
+        self.window_drops = 0
+        self.set_smooth(True)
+
+        self.prepare_windows()
+
+        self.load_started = time.perf_counter()
+        if self.streaming:
+            # Decode frames just ahead of the play head instead of all at once
+            self.total_frames = self.start_streams()
+        else:
+            # Preload and scale images
+            self.total_frames = self.load_and_scale_images()
+
+        if not self.total_frames:
+            self.release_frames()
+            return False
+
+        self.sound_file = sound_file
+        if self.streaming and not self.streams_ready():
+            # Shown by on_frame_loaded once the first frames are there
+            self.starting = True
+            self.start_timer.start(self.FIRST_FRAME_TIMEOUT_MS)
+            return True
+        self.start_playback()
+        return True
+
+    def start_playback(self):
+        # Show the first frames and start the sound and the clock with them
+        self.starting = False
+        self.start_timer.stop()
+        # Time until the first frame can be shown
+        self.load_ms = round((time.perf_counter() - self.load_started) * 1000, 1)
+        if self.metrics.enabled:
+            self.metrics.set("pixmap_bytes", self.pixmap_bytes())
+        self.show_windows()
+
+        # Start sound if available
+        self.player = self.sounds.play(self.sound_file, follow=True)
+
+        # Frames follow the sound when there is one, the wall clock otherwise
+        if self.player is None:
+            self.clock = FreeClock()
+        else:
+            self.clock = AudioClock(self.player)
+        self.clock.start()
+
+        self.timer.start(0)  # Start immediately
+
+    def target_screens(self):
+        if not self.all_screens:
+            return [self.screen()]
+        # This window takes the primary screen
+        primary = QGuiApplication.primaryScreen()
+        return [primary] + [screen for screen in QGuiApplication.screens() if screen is not primary]
+
+    def variant_key(self, screen):
+        size = self.load_size(screen)
+        return (size.width(), size.height(), screen.devicePixelRatio())
+
+    def prepare_windows(self):
+        # One overlay per screen, grouped by the frames they can share
+        self.screens = self.target_screens()
+        while len(self.overlays) < len(self.screens) - 1:
+            self.overlays.append(OverlayWindow())
+        while len(self.overlays) > len(self.screens) - 1:
+            self.overlays.pop().deleteLater()
+
+        self.variants = {}
+        for window, screen in zip([self] + self.overlays, self.screens):
+            key = self.variant_key(screen)
+            if key not in self.variants:
+                self.variants[key] = ScreenVariant(self.load_size(screen), screen.devicePixelRatio())
+            self.variants[key].views.append(window.view)
+
+    def show_windows(self):
+        for window, screen in zip([self] + self.overlays, self.screens):
+            window.show_on(screen)
+
+    def set_smooth(self, smooth):
+        for window in [self] + self.overlays:
+            window.view.smooth = smooth
+
+    def prefetch(self, image_folder):
+        # Start loading an upcoming animation while the app is idle. The
+        # streaming decoder only needs a head start, a preload needs it all.
+        self.cancel_prefetch()
+        self.load_timings = StageTimings(self.metrics)
+        limit = self.ring_size if self.streaming else None
+
+        keys = {}
+        for screen in self.target_screens():
+            keys[self.variant_key(screen)] = (self.load_size(screen), screen.devicePixelRatio())
+        sources = self.open_frame_sources(image_folder, keys.values())
+
+        self.prefetch_pending = len(sources)
+        self.prefetched = {
+            key: PrefetchedSource(source, image_folder, key, limit, self.on_prefetch_loaded)
+            for key, source in zip(keys, sources)
+        }
+
+    def on_prefetch_loaded(self):
+        # Called from each loading thread, the prefetch is ready with the last
+        with self.prefetch_lock:
+            self.prefetch_pending -= 1
+            ready = self.prefetch_pending == 0
+        if ready:
+            self.prefetch_ready.emit()
+
+    def cancel_prefetch(self):
+        for source in self.prefetched.values():
+            source.close()
+        self.prefetched = {}
+
+    def load_and_scale_images(self):
+        sources = self.take_frame_sources()
+        frame_count = min(source.frame_count for source in sources.values())
+        for key, source in sources.items():
+            self.variants[key].reset(source.frame_size)
+        # Variants load the same frame one after the other, so a frame
+        # decoded once for all of them can be dropped right away
+        for index in range(frame_count):
+            for key, source in sources.items():
+                frame = source.load(index)
+                # Pixmaps can only be made here, on the GUI thread
+                started = time.perf_counter()
+                self.variants[key].frames.append(frame.to_pixmaps())
+                self.load_timings.add("pixmap", started)
+        for source in sources.values():
+            source.close()
+        return frame_count
+
+    def load_size(self, screen):
+        # Size frames are scaled to, capped to `max_height` to bound memory and
+        # scaling time on large screens
+        size = screen.size()
+        if self.max_height and size.height() > self.max_height:
+            size = size.scaled(QSize(size.width(), self.max_height), Qt.KeepAspectRatio)
+        return size
+
+    def open_frame_sources(self, image_folder, sizes):
+        # One source per (size, dpr). Frames come from the cache when they
+        # were already scaled for that screen, those decoded from the folder
+        # are decoded once for all sizes.
+        sizes = list(sizes)
+        store = None
+        if len(sizes) > 1:
+            store = DecodedStore(frame_files(image_folder), self.load_timings)
+        return [
+            open_source(
+                image_folder,
+                size,
+                self.cache,
+                dpr,
+                self.decode_threads,
+                self.load_timings,
+                store,
+                # A stream holds no more frames than its ring, in flight or not
+                self.ring_size if self.streaming else None,
+                # A stream leaves late frames out, the cache is filled once
+                # the animation is over
+                self.streaming,
+            )
+            for size, dpr in sizes
+        ]
+
+    def take_frame_sources(self):
+        # Use the prefetched frames when they were loaded for this animation
+        # and these screens
+        prefetched, self.prefetched = self.prefetched, {}
+        if prefetched.keys() == self.variants.keys() and all(
+            source.matches(self.image_folder, key) for key, source in prefetched.items()
+        ):
+            sources = prefetched
+        else:
+            for source in prefetched.values():
+                source.close()
+            self.load_timings = StageTimings(self.metrics)
+            sources = self.open_frame_sources(
+                self.image_folder,
+                [(variant.size, variant.dpr) for variant in self.variants.values()],
+            )
+            sources = dict(zip(self.variants, sources))
+        self.cache_fill = self.fills_cache(sources.values())
+        return sources
+
+    def fills_cache(self, sources):
+        # Whether the frames are decoded and scaled for cache entries still
+        # missing, a slower run than the next ones will be
+        if self.cache is None:
+            return False
+        for source in sources:
+            if isinstance(source, PrefetchedSource):
+                source = source.source
+            if isinstance(source, FolderSource) and source.needs_scaling:
+                return True
+        return False
+
+    def start_streams(self):
+        sources = self.take_frame_sources()
+        frame_count = min(source.frame_count for source in sources.values())
+        if not frame_count:
+            for source in sources.values():
+                source.close()
+            return 0
+        for key, source in sources.items():
+            variant = self.variants[key]
+            variant.reset(source.frame_size)
+            variant.stream = FrameStream(source, self.ring_size, self.frame_loaded.emit)
+        return frame_count
+
+    def streams_ready(self):
+        # Whether every screen has its first frame
+        return all(variant.stream.ready() for variant in self.variants.values())
+
+    def on_frame_loaded(self):
+        if self.starting:
+            if self.streams_ready():
+                self.start_playback()
+            elif any(variant.stream.finished for variant in self.variants.values()):
+                # A stream ended without a single frame
+                self.fail_start("no frames")
+        elif self.waiting_for_frames:
+            self.update_image()
+
+    def on_start_timeout(self):
+        if self.starting:
+            self.metrics.inc("first_frame_timeouts")
+            self.fail_start(f"no frame after {self.FIRST_FRAME_TIMEOUT_MS} ms")
+
+    def fail_start(self, reason):
+        # Nothing was shown or played, the caller signals the cue another way
+        self.metrics.event("animation_start_failed", folder=os.path.basename(self.image_folder), reason=reason)
+        print(f"Animation {self.image_folder} not started: {reason}", file=sys.stderr)
+        self.release_frames()
+        self.start_failed.emit()
+
+    def update_image(self):
+        self.waiting_for_frames = False
+        # Calculate frame index based on elapsed time
+        elapsed_ms = self.clock.elapsed()
+        frame_index = int(elapsed_ms / self.frame_duration)
+
+        if frame_index >= self.total_frames:
+            self.end_animation()
+            return
+
+        # Delta frames build on each other, apply every one not shown yet
+        for variant in self.variants.values():
+            frames, variant_index = variant.take(frame_index)
+            if frames:
+                variant.show(frames)
+            variant.shown_index = variant_index
+        # A frame is shown once every screen shows it
+        ready_index = min(variant.shown_index for variant in self.variants.values())
+
+        if ready_index > self.shown_index:
+            # Frames painted over before ever being seen were dropped, unless
+            # skipping them was the plan
+            passed = max(0, ready_index - self.shown_index - 1)
+            skipped = min(passed, self.frame_step - 1)
+            self.skipped_frames += skipped
+            self.dropped_frames += passed - skipped
+            self.shown_index = ready_index
+            lag = elapsed_ms - ready_index * self.frame_duration
+            self.frame_lags.append(lag)
+            # A frame shown a whole frame late missed its deadline as well
+            missed = passed - skipped + (lag > self.frame_duration)
+            self.check_quality(missed)
+
+            if self.metrics.enabled:
+                now = time.perf_counter()
+                if self.last_shown_at is not None:
+                    self.metrics.observe("frame_interval_ms", (now - self.last_shown_at) * 1000)
+                self.last_shown_at = now
+                self.metrics.inc("deadline_misses", missed)
+
+        if ready_index < frame_index:
+            # The decoder is late: the next frame it loads wakes this up, and
+            # the timer only checks again a frame later in case it is stuck
+            self.waiting_for_frames = True
+            self.timer.start(math.ceil(self.frame_duration))
+        else:
+            next_deadline = (self.shown_index + self.frame_step) * self.frame_duration
+            self.timer.start(max(0, math.ceil(next_deadline - self.clock.elapsed())))
+
+    def check_quality(self, missed):
+        if not self.adaptive_quality:
+            return
+        self.window_frames += 1 + missed
+        self.window_drops += missed
+        if self.window_frames < self.ADAPT_WINDOW:
+            return
+        if self.window_drops > self.ADAPT_MAX_DROPS:
+            if self.quality_level == 0:
+                # Cheaper upscaling first
+                self.set_smooth(False)
+            elif self.quality_level == 1:
+                # Then only present every other frame
+                self.frame_step = 2
+            self.quality_level = min(self.quality_level + 1, 2)
+        self.window_frames = 0
+        self.window_drops = 0
+
+    def end_animation(self):
+        # Frames the decoder never delivered in time were dropped too
+        self.dropped_frames += max(0, self.total_frames - self.shown_index - 1)
+        self.finished.emit({
+            "frames": self.total_frames,
+            "shown": self.total_frames - self.dropped_frames - self.skipped_frames,
+            "dropped": self.dropped_frames,
+            "skipped": self.skipped_frames,
+            "cache_fill": self.cache_fill,
+            "quality_level": self.quality_level,
+            "frame_lag": summarize(self.frame_lags),
+            "clock_error": self.clock.stats(),
+            "load_ms": self.load_ms,
+            "load_stages": self.load_timings.report(),
+            "audio_start_ms": self.clock.start_latency,
+            "pixmap_bytes": self.pixmap_bytes(),
+        })
+        # The sound is left to finish on its own
+        self.release_frames()
+
+    def stop(self, finish_cache=True):
+        # Interrupt the animation and its sound
+        if self.player is not None:
+            self.player.stop()
+        self.release_frames(finish_cache)
+
+    def release_frames(self, finish_cache=True):
+        # Free everything held for the current animation and hide the windows.
+        # Cache entries a stream did not find are then filled in the
+        # background, unless `finish_cache` is False.
+        self.timer.stop()
+        self.waiting_for_frames = False
+        self.starting = False
+        self.start_timer.stop()
+        if self.clock is not None:
+            self.clock.stop()
+            self.clock = None
+        self.player = None
+        for variant in self.variants.values():
+            variant.release()
+        if self.cache is not None and finish_cache and self.streaming and self.variants:
+            self.cache.fill(self.image_folder, [(variant.size, variant.dpr) for variant in self.variants.values()])
+        self.variants = {}
+        if self.cache_paused:
+            self.cache.resume()
+            self.cache_paused = False
+        for window in [self] + self.overlays:
+            window.hide()
+        self.metrics.set("pixmap_bytes", 0)
+
+    def dispose(self):
+        # Final teardown, the window is not used again: nothing keeps playing
+        # or loading, cache entries still being finished are given up, and
+        # the overlays and this window are deleted by Qt rather than whenever
+        # Python collects them
+        self.stop(finish_cache=False)
+        self.cancel_prefetch()
+        if self.cache is not None:
+            self.cache.close()
+        for window in self.overlays:
+            window.deleteLater()
+        self.overlays = []
+        self.deleteLater()
+
+    def pixmap_bytes(self):
+        # Memory held by the canvases and the preloaded frames
+        pixmaps = [pixmap for variant in self.variants.values() for pixmap in variant.pixmaps()]
+        return sum(pixmap.width() * pixmap.height() * pixmap.depth() // 8 for pixmap in pixmaps)
@@ -0,0 +1,31 @@
+import math
+import time
+
+from PySide6.QtCore import Qt, QTimer
+
+from cycle import Deadlines
+
+# Longest interval a QTimer accepts, in milliseconds
+MAX_TIMER_MS = 2 ** 31 - 1
+
+
+class DeadlineScheduler(Deadlines):
+    # Runs callbacks at absolute deadlines on the monotonic clock. A single
+    # timer is armed for the earliest deadline, so the process only wakes up
+    # when something is due, and deadlines planned from one another do not
+    # drift the way re-armed relative intervals do.
+
+    def __init__(self, clock=time.monotonic):
+        super().__init__(clock)
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.run_due)
+
+    def arm(self):
+        earliest = self.next_deadline()
+        if earliest is None:
+            self.timer.stop()
+            return
+        delay_ms = math.ceil((earliest - self.clock()) * 1000)
+        self.timer.start(min(max(0, delay_ms), MAX_TIMER_MS))
@@ -0,0 +1,232 @@
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+
+from PySide6.QtCore import QTimer
+
+from bench import peak_rss_mb, windows_memory_counters
+
+# Drives the app through thousands of transitions, far faster than a real
+# day, and checks that memory and Qt objects stay flat. Animations are cut
+# short by the next transition, some run to their end, the cycle is paused
+# and resumed, the next animation is prefetched and the tray windows are
+# opened, like over weeks of use.
+
+
+def current_rss_mb():
+    # Resident memory right now, peak memory where it cannot be read
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if sys.platform == "win32":
+        counters = windows_memory_counters()
+        if counters is not None:
+            return round(counters.WorkingSetSize / (1024 * 1024), 1)
+    return peak_rss_mb()
+
+
+def write_clip(folder, frames, size):
+    # A short synthetic animation: a disc crossing a transparent canvas
+    from PySide6.QtGui import QImage, QPainter, QColor
+    from PySide6.QtCore import Qt
+
+    os.makedirs(folder)
+    for index in range(frames):
+        image = QImage(size, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        painter.setBrush(QColor(255, 80, 40, 200))
+        radius = size.height() // 4
+        x = (size.width() - 2 * radius) * index // max(1, frames - 1)
+        painter.drawEllipse(x, size.height() // 2 - radius, 2 * radius, 2 * radius)
+        painter.end()
+        image.save(os.path.join(folder, f"{index:04}.png"))
+
+
+def live_objects():
+    # Qt objects still alive once deferred deletions went through
+    from PySide6.QtCore import QObject, QCoreApplication, QEvent
+    from PySide6.QtGui import QPixmap
+    from PySide6.QtWidgets import QApplication
+
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    gc.collect()
+    objects = gc.get_objects()
+    return {
+        "widgets": len(QApplication.allWidgets()),
+        "qobjects": sum(1 for o in objects if isinstance(o, QObject)),
+        "pixmaps": sum(1 for o in objects if isinstance(o, QPixmap)),
+        "python_objects": len(objects),
+        "threads": threading.active_count(),
+    }
+
+
+class Soak:
+    def __init__(self, args, main, clip_ms):
+        self.args = args
+        self.main = main
+        # An animation left to run to its end, plus some slack
+        self.clip_ms = clip_ms + 50
+        self.transitions = 0
+        self.samples = []
+        self.started = time.perf_counter()
+
+    def settle(self):
+        # Nothing playing or loading, so every sample is taken in the same state
+        window = self.main.animation_window
+        if window is not None:
+            window.stop()
+            window.cancel_prefetch()
+        if self.main.corner_overlay is not None:
+            self.main.corner_overlay.stop()
+        # Cache entries of animations cut short are completed in the background
+        self.main.frame_cache.wait_filled(60)
+
+    def sample(self):
+        self.settle()
+        sample = {"transitions": self.transitions, "rss_mb": current_rss_mb()}
+        sample.update(live_objects())
+        self.samples.append(sample)
+        print(json.dumps(sample), file=sys.stderr)
+
+    def step(self):
+        main = self.main
+        if self.transitions % self.args.sample_every == 0:
+            self.sample()
+        if self.transitions == self.args.transitions:
+            main.app.quit()
+            return
+
+        self.transitions += 1
+        hold_ms = self.args.hold_ms
+        turn = self.transitions % 20
+        if turn == 0:
+            # Paused and resumed, the resume shows the counter animation
+            main.toggle_pause()
+            main.toggle_pause()
+        elif turn == 5:
+            # Next animation loaded ahead of its cue, then cut short by it
+            main.prefetch_next_animation()
+            main.cycle.run_cycle()
+        elif turn == 10:
+            main.cycle.run_cycle()
+            hold_ms = self.clip_ms
+        elif turn == 15:
+            main.show_settings()
+            main.show_stats()
+            main.show_metrics()
+            main.cycle.run_cycle()
+        else:
+            main.cycle.run_cycle()
+        QTimer.singleShot(hold_ms, self.step)
+
+    def report(self):
+        # Growth is measured from the first sample after the warm-up, when
+        # pools, caches and lazy imports are all in place
+        after = [sample for sample in self.samples if sample["transitions"] >= self.args.warmup]
+        if len(after) < 2:
+            return {"errors": ["not enough samples after the warm-up"]}
+        first, last = after[0], after[-1]
+        growth = {
+            key: round(last[key] - first[key], 1)
+            for key in ("rss_mb", "widgets", "qobjects", "pixmaps", "python_objects", "threads")
+        }
+        slope = statistics.linear_regression(
+            [sample["transitions"] for sample in after],
+            [sample["rss_mb"] for sample in after],
+        ).slope
+
+        errors = []
+        if growth["rss_mb"] > self.args.max_rss_growth_mb:
+            errors.append(f"resident memory grew by {growth['rss_mb']} MB")
+        for key in ("widgets", "qobjects", "pixmaps", "threads"):
+            if growth[key] > 0:
+                errors.append(f"{growth[key]} more {key.replace('_', ' ')}")
+        if growth["python_objects"] > self.args.max_object_growth:
+            errors.append(f"{growth['python_objects']} more Python objects")
+        seconds = time.perf_counter() - self.started
+        return {
+            "transitions": self.transitions,
+            "seconds": round(seconds, 1),
+            "transitions_per_second": round(self.transitions / seconds, 1),
+            "growth": growth,
+            "rss_mb_per_1000": round(slope * 1000, 2),
+            "samples": self.samples,
+            "errors": errors,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that transitions do not leak memory or Qt objects, offscreen.")
+    parser.add_argument("--transitions", type=int, default=2000, help="transitions to run (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=200, help="transitions left out of the growth (default: %(default)s)")
+    parser.add_argument("--sample-every", type=int, default=100, help="transitions between samples (default: %(default)s)")
+    parser.add_argument("--hold-ms", type=int, default=20, help="time each animation plays before the next one (default: %(default)s)")
+    parser.add_argument("--frames", type=int, default=8, help="frames of the synthetic clips (default: %(default)s)")
+    parser.add_argument("--real", action="store_true", help="play the animations from img/ instead of synthetic clips")
+    parser.add_argument("--alert", choices=("animation", "overlay", "notification"), default="animation", help="alert tier to soak (default: %(default)s)")
+    parser.add_argument("--sound", help="sound played with every cue, a .wav goes through the sound effects")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=16, help="allowed memory growth (default: %(default)s)")
+    parser.add_argument("--max-object-growth", type=int, default=2000, help="allowed Python object growth (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="write the report to this file instead of stdout")
+    args = parser.parse_args()
+    if args.transitions < args.warmup + 2 * args.sample_every:
+        parser.error("--transitions leaves fewer than two samples after the warm-up")
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtCore import QSize, QStandardPaths
+
+    # Keep the user's configuration, statistics and frame cache out of it
+    QStandardPaths.setTestModeEnabled(True)
+
+    import notime
+    from frames import FrameCache, frame_files
+
+    tmp = tempfile.mkdtemp(prefix="notime-soak-")
+    try:
+        app = notime.MainApp()
+        app.settings["startup_animation"] = "skip"
+        app.settings["metrics"] = "off"
+        app.settings["alert"] = args.alert
+        # Frames dropped by the accelerated run must not change the tier
+        app.settings["alert_fallback"] = False
+        app.frame_cache = FrameCache(os.path.join(tmp, "frame_cache"), 1 << 30)
+        if not args.real:
+            for cue in app.cues:
+                write_clip(os.path.join(tmp, cue), args.frames, QSize(640, 360))
+        for cue, (folder, _) in app.cues.items():
+            app.cues[cue] = (folder if args.real else os.path.join(tmp, cue), args.sound)
+        app.counter_folder, app.counter_sound = app.cues["counter"]
+        app.over_folder, app.over_sound = app.cues["over"]
+        app.sound_enabled = args.sound is not None
+
+        frames = len(frame_files(app.counter_folder))
+        soak = Soak(args, app, frames * 1000 / 30)
+        QTimer.singleShot(0, soak.step)
+        # Quitting shuts the app down as usual
+        app.run()
+        result = soak.report()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import sys
+import os
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import datetime
+
+# Transitions recorded by the app, and the state each one starts
+TRANSITIONS = {
+    "start": "work",
+    "work": "work",
+    "break": "break",
+    "pause": "paused",
+    "resume": "work",
+    "restart": "work",
+    "stop": None,
+}
+STATES = ("work", "break", "paused")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    state TEXT NOT NULL,
+    seconds REAL NOT NULL DEFAULT 0,
+    periods INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, state)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    time REAL NOT NULL
+);
+"""
+
+# Aggregates are bumped in place, the raw events are only read for exports
+ADD_TO_DAY = """
+INSERT INTO daily (day, state, seconds, periods) VALUES (?, ?, ?, ?)
+ON CONFLICT (day, state) DO UPDATE SET
+    seconds = seconds + excluded.seconds,
+    periods = periods + excluded.periods
+"""
+
+
+def day_key(day):
+    return day.isoformat()
+
+
+def week_key(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02}"
+
+
+def split_by_day(start, end):
+    # Yield (local date, seconds) for the span [start, end] in Unix time
+    while start < end:
+        day = datetime.date.fromtimestamp(start)
+        midnight = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time()).timestamp()
+        stop = min(end, midnight)
+        yield day, stop - start
+        start = stop
+
+
+class StatsStore:
+    # Work, break and pause transitions in SQLite. Each transition closes the
+    # period of the previous state, whose time is added to the daily
+    # aggregates right away, so range queries read a few aggregate rows
+    # instead of scanning events. Weeks are summed from those days.
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        # ISO week of a daily row, for queries grouping days by week
+        self.db.create_function(
+            "week_key", 1, lambda day: week_key(datetime.date.fromisoformat(day)), deterministic=True
+        )
+
+        # State of the last transition and when it happened
+        self.state = None
+        self.since = None
+        row = self.db.execute("SELECT time, kind FROM events ORDER BY time DESC, id DESC LIMIT 1").fetchone()
+        if row is not None:
+            self.since, kind = row
+            self.state = TRANSITIONS.get(kind)
+        # Last time the running app was known to be alive
+        row = self.db.execute("SELECT time FROM checkpoint").fetchone()
+        self.checkpoint_time = row[0] if row is not None else None
+
+    def recover(self):
+        # A period left open by a crash or a forced logout is closed at the
+        # last checkpoint, or where it started when there was none since
+        if self.state is not None:
+            ended = self.since
+            if self.checkpoint_time is not None:
+                ended = max(ended, self.checkpoint_time)
+            self.record("stop", ended)
+
+    def checkpoint(self, when=None):
+        # Called regularly while the app runs, so a crash loses little time
+        if when is None:
+            when = time.time()
+        try:
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO checkpoint (id, time) VALUES (0, ?)", (when,))
+        except sqlite3.Error:
+            return
+        self.checkpoint_time = when
+
+    def record(self, kind, when=None):
+        # Record a transition, `when` defaults to now
+        if when is None:
+            when = time.time()
+        state = TRANSITIONS[kind]
+        try:
+            with self.db:
+                self.db.execute("INSERT INTO events (time, kind) VALUES (?, ?)", (when, kind))
+                if self.state is not None and when > self.since:
+                    for day, seconds in split_by_day(self.since, when):
+                        self.db.execute(ADD_TO_DAY, (day_key(day), self.state, seconds, 0))
+                if state is not None:
+                    day = datetime.date.fromtimestamp(when)
+                    self.db.execute(ADD_TO_DAY, (day_key(day), state, 0, 1))
+        except sqlite3.Error:
+            # Statistics must never take the app down
+            return
+        self.state = state
+        self.since = when
+
+    def open_seconds(self, start_day, end_day):
+        # Time of the current, not yet closed period that falls in the range
+        if self.state is None:
+            return 0.0
+        return sum(
+            seconds
+            for day, seconds in split_by_day(self.since, time.time())
+            if start_day <= day <= end_day
+        )
+
+    def daily(self, start_day, end_day):
+        # {day: {state: (seconds, periods)}} for days in the range, inclusive
+        days = {}
+        rows = self.db.execute(
+            "SELECT day, state, seconds, periods FROM daily WHERE day BETWEEN ? AND ? ORDER BY day",
+            (day_key(start_day), day_key(end_day)),
+        )
+        for day, state, seconds, periods in rows:
+            days.setdefault(day, {})[state] = (seconds, periods)
+        return days
+
+    def weekly(self, start_day, end_day):
+        # {week: {state: (seconds, periods)}} summed over the days in the
+        # range, inclusive, so the first and last weeks may be partial
+        weeks = {}
+        rows = self.db.execute(
+            "SELECT week_key(day) AS week, state, SUM(seconds), SUM(periods) FROM daily "
+            "WHERE day BETWEEN ? AND ? GROUP BY week, state ORDER BY week",
+            (day_key(start_day), day_key(end_day)),
+        )
+        for week, state, seconds, periods in rows:
+            weeks.setdefault(week, {})[state] = (seconds, periods)
+        return weeks
+
+    def totals(self, start_day, end_day):
+        # {state: (seconds, periods)} over the range, the current period included
+        totals = {state: [0.0, 0] for state in STATES}
+        rows = self.db.execute(
+            "SELECT state, SUM(seconds), SUM(periods) FROM daily WHERE day BETWEEN ? AND ? GROUP BY state",
+            (day_key(start_day), day_key(end_day)),
+        )
+        for state, seconds, periods in rows:
+            totals[state] = [seconds, periods]
+        if self.state is not None:
+            totals[self.state][0] += self.open_seconds(start_day, end_day)
+        return {state: tuple(values) for state, values in totals.items()}
+
+    def last_days(self, days):
+        # Date range of the last `days` days, today included
+        today = datetime.date.today()
+        return today - datetime.timedelta(days=days - 1), today
+
+    def events(self, start, end):
+        # Raw transitions between two Unix times
+        return self.db.execute(
+            "SELECT time, kind FROM events WHERE time >= ? AND time < ? ORDER BY time, id",
+            (start, end),
+        ).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+def format_duration(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    return f"{hours}:{remainder // 60:02}"
+
+
+def default_path():
+    # Same folder as the app's configuration file
+    from PySide6.QtCore import QStandardPaths, QCoreApplication
+
+    QCoreApplication.setOrganizationName("SECRET_GUEST")
+    QCoreApplication.setApplicationName("NOTIME")
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.AppDataLocation), "stats.sqlite")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export work and break statistics.")
+    parser.add_argument("--db", help="statistics database (default: the app's)")
+    parser.add_argument("--days", type=int, default=30, help="last DAYS days, today included (default: %(default)s)")
+    parser.add_argument("--weekly", action="store_true", help="one row per ISO week instead of per day")
+    parser.add_argument("--events", action="store_true", help="export raw transitions instead of aggregates")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    args = parser.parse_args()
+
+    path = args.db or default_path()
+    if not os.path.exists(path):
+        print(f"{path}: no statistics yet", file=sys.stderr)
+        return 1
+    store = StatsStore(path)
+    start_day, end_day = store.last_days(args.days)
+
+    if args.events:
+        start = datetime.datetime.combine(start_day, datetime.time()).timestamp()
+        header = ["time", "kind"]
+        rows = [
+            [datetime.datetime.fromtimestamp(when).isoformat(timespec="seconds"), kind]
+            for when, kind in store.events(start, time.time() + 1)
+        ]
+    else:
+        periods = store.weekly(start_day, end_day) if args.weekly else store.daily(start_day, end_day)
+        header = ["week" if args.weekly else "day"]
+        for state in STATES:
+            header += [f"{state}_seconds", f"{state}_periods"]
+        rows = []
+        for period, states in periods.items():
+            row = [period]
+            for state in STATES:
+                seconds, count = states.get(state, (0.0, 0))
+                row += [round(seconds), count]
+            rows.append(row)
+    store.close()
+
+    if args.format == "json":
+        print(json.dumps([dict(zip(header, row)) for row in rows], indent=2))
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())